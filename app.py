@@ -4,12 +4,19 @@ from flask import Flask, jsonify, render_template, request, url_for, redirect, B
 import os
 import json
 import jinja2
+import click
+from pymongo.errors import PyMongoError
 import os
 from services.cluster import ClusterService
 from services.server import ServerService
 from utils.notify import *
 from flask_session import Session
-from utils.config import flask_port, flask_admin_user, flask_admin_password
+from utils.config import flask_port, flask_admin_user, flask_admin_password, inconsistency_backend, mongo_ensure_indexes
+from utils.database import clusters_collection, servers_collection
+from utils.inconsistency import get_profile
+from utils.inconsistency_scan import scan_collection
+from utils.indexes import ensure_all_indexes, index_reports
+from utils.json_provider import JSONProvider
 from view.auth import login_manager
 from dotenv import load_dotenv
 load_dotenv()
@@ -21,6 +28,8 @@ env.globals.update(zip=zip)
 # init Flask and inject new variables
 # =============================================================================
 app = Flask(__name__)
+# ObjectId, datetime and the models in every JSON response, with orjson when installed
+app.json = JSONProvider(app)
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['SECRET_KEY'] = os.urandom(16)
 app.jinja_env.filters['zip'] = zip
@@ -51,19 +60,70 @@ from view.cluster_api import(cluster_api)
 app.register_blueprint(cluster_api, url_prefix="/api/clusters")
 from view.cluster import(cluster_bp)
 app.register_blueprint(cluster_bp, url_prefix="/clusters")
+
+# Stats API
+from view.stats_api import(stats_api)
+app.register_blueprint(stats_api, url_prefix="/api/stats")
+
+# Conflict API
+from view.conflict_api import(conflict_api)
+app.register_blueprint(conflict_api, url_prefix="/api/conflicts")
+
 # =============================================================================
 # Flask route
 # =============================================================================
 @app.route("/", methods = ['GET'])
 def index():
     # return redirect(url_for('upload.upload'))
-    cluster_service = ClusterService()
-    server_service = ServerService()
-    cluster_count = cluster_service.count()
-    server_count = server_service.count()
-    server_inconsistencies_count = len(server_service.find_network_inconsistencies_all())
-    cluster_inconsistencies_count = len(cluster_service.find_network_inconsistencies_all())
-    return render_template('index.html', server_count=server_count, cluster_count = cluster_count, server_inconsistencies_count = server_inconsistencies_count, cluster_inconsistencies_count = cluster_inconsistencies_count),200
+    # the counters are loaded by the page from /api/stats
+    return render_template('index.html'),200
+
+# =============================================================================
+# Flask CLI
+# =============================================================================
+@app.cli.command("rebuild-inconsistencies")
+def rebuild_inconsistencies():
+    """Recompute the materialized inconsistencies of every server and cluster."""
+    ServerService().rebuild_inconsistencies()
+    ClusterService().rebuild_inconsistencies()
+    print("[Success] Inconsistencies rebuilt")
+
+@app.cli.command("scan-inconsistencies")
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True, help="Number of worker processes.")
+@click.option("--backend", type=click.Choice(["js", "python"]), default=None, help="Defaults to [inconsistency] backend.")
+@click.option("--profile", default=None, help="Check profile from config.ini.")
+@click.option("--output", default="inconsistency_report.json", show_default=True, help="Report file.")
+def scan_inconsistencies(workers, backend, profile, output):
+    """Full parallel inconsistency scan of servers and clusters for the nightly report."""
+    # the process pool only runs here, never inside a web request
+    profile_name = get_profile(profile).name if profile else None
+    report = {
+        name: scan_collection(collection, workers, backend or inconsistency_backend, profile_name)
+        for name, collection in (("servers", servers_collection), ("clusters", clusters_collection))
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4, default=str)
+    for name, collection_report in report.items():
+        print(f"[Info] {name}: {len(collection_report['results'])} inconsistent in {collection_report['seconds']}s")
+        for shard in collection_report["shards"]:
+            print(f"    shard {shard['shard']}: {shard['inconsistent']} inconsistent in {shard['seconds']}s")
+    print(f"[Success] Report written to {output}")
+
+@app.cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create the missing indexes declared in utils/indexes.py."""
+    for collection_name, status in ensure_all_indexes().items():
+        for index_name, result in status.items():
+            print(f"[Info] {collection_name}.{index_name}: {result}")
+
+@app.cli.command("index-report")
+def index_report():
+    """List missing, undeclared and unused indexes from $indexStats."""
+    for report in index_reports():
+        print(f"[Info] {report['collection']}")
+        print(f"    missing:    {', '.join(report['missing']) or '-'}")
+        print(f"    undeclared: {', '.join(report['undeclared']) or '-'}")
+        print(f"    unused:     {', '.join(report['unused']) or '-'}")
 
 # =============================================================================
 # Flask handler
@@ -115,6 +175,15 @@ def initialize_app():
         }
         with open(file_path, 'w') as file:
             json.dump(default_data, file, indent=4)
+
+    if mongo_ensure_indexes:
+        try:
+            for collection_name, status in ensure_all_indexes().items():
+                failed = {name: result for name, result in status.items() if result.startswith("failed")}
+                if failed:
+                    print(f"[Error] Failed to create indexes on '{collection_name}': {failed}")
+        except PyMongoError as error:
+            print(f"[Error] Failed to ensure indexes: {error}")
     
 @app.before_request
 def before_request():
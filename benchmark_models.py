@@ -0,0 +1,163 @@
+"""
+Benchmark of the model conversions run for every listed document.
+
+Decodes synthetic server and cluster documents shaped like the ones fake.py
+generates with from_dict, encodes them back with to_dict, and reports objects
+per second and the memory held per decoded object. The "loaded" rows decode
+the networks and sources as well, like the write paths do with models.lazy.load.
+
+The "baseline" rows run the same documents through the models of another git
+revision, by default the dict-based models before models/codec.py was added.
+Those decode everything in from_dict, so compare them with the loaded rows too.
+
+    python benchmark_models.py --count 20000 --sources 6
+    python benchmark_models.py --baseline HEAD~1
+"""
+import argparse
+import gc
+import importlib
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+from models.cluster import Cluster
+from models.lazy import load
+from models.server import Server
+
+LAST_UPDATED = "2024-12-19T19:30:00.660+00:00"
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _ip_networks(index):
+    return [
+        {"name": name, "type": "ip", "ip": f"{prefix}.{index // 256 % 256}.{index % 256}.1",
+         "subnet_mask": "255.255.255.0", "mac": f"02:00:00:{index // 256 % 256:02X}:{index % 256:02X}:{offset:02X}"}
+        for offset, (name, prefix) in enumerate((("data", "10.0"), ("maas", "192.0"), ("admin", "11.0")))
+    ]
+
+def server_document(index, sources=2):
+    general = {
+        "hostname": f"TW-DC1-R1-A01-{index}", "serial_number": f"sn-{index}", "location": "TW",
+        "datacenter": "DC1", "room": "R1", "rack": "A01", "unit": index % 50, "os": "ubuntu 22.04",
+        "as_number": 64600 + index % 200, "owner": "user1", "cluster_id": f"envconfig_c{index % 3}",
+        "env_config": f"envconfig_c{index % 3}",
+    }
+    return {
+        "server_id": f"sn-{index}", **general,
+        "additional_info": {"description": "benchmark server"},
+        "networks": _ip_networks(index),
+        "sources": {
+            "Inventory": {**general, "networks": _ip_networks(index), "last_updated": LAST_UPDATED},
+            "Maas": {"hostname": general["hostname"], "networks": _ip_networks(index)[:1], "last_updated": LAST_UPDATED},
+            **{
+                f"Source{number}": {**general, "networks": _ip_networks(index), "last_updated": LAST_UPDATED}
+                for number in range(2, sources)
+            },
+        },
+        "last_updated": LAST_UPDATED,
+    }
+
+def cluster_document(index):
+    networks = [
+        {"name": "pod_cidr", "type": "cidr", "cidrs": [f"172.{index % 256}.0.0/16"]},
+        {"name": "egress", "type": "hostsubnet", "hostname": f"node-{index}",
+         "egress_cidrs": [f"10.{index % 256}.0.0/24"], "egress_ips": [f"10.{index % 256}.0.10"]},
+    ]
+    return {
+        "cluster_id": f"cluster-{index}", "cluster_name": f"cluster {index}", "env_config": f"cluster-{index}",
+        "owners": ["user1", "user2"], "additional_info": {"description": "benchmark cluster"},
+        "networks": networks,
+        "sources": {"cilium": {"env_config": f"cluster-{index}", "networks": networks, "last_updated": LAST_UPDATED}},
+        "last_updated": LAST_UPDATED,
+    }
+
+def _git(*args):
+    return subprocess.run(["git", *args], cwd=ROOT, check=True, capture_output=True).stdout
+
+def default_baseline():
+    """The revision before models/codec.py was added."""
+    added = _git("log", "--diff-filter=A", "--format=%H", "--", "models/codec.py").split()
+    return f"{added[-1].decode()}^" if added else "HEAD"
+
+def baseline_models(revision):
+    """
+    (Server, Cluster) of the models package at a git revision.
+
+    The package is imported from a temporary copy in place of the current one, then
+    the current modules are put back; the returned classes keep their own globals.
+    """
+    def models_modules():
+        return {name: module for name, module in sys.modules.items() if name == "models" or name.startswith("models.")}
+
+    current = models_modules()
+    with tempfile.TemporaryDirectory() as directory:
+        tarfile.open(fileobj=io.BytesIO(_git("archive", revision, "models"))).extractall(directory)
+        for name in current:
+            del sys.modules[name]
+        sys.path.insert(0, directory)
+        try:
+            server = importlib.import_module("models.server")
+            cluster = importlib.import_module("models.cluster")
+        finally:
+            sys.path.remove(directory)
+            for name in models_modules():
+                del sys.modules[name]
+            sys.modules.update(current)
+    return server.Server, cluster.Cluster
+
+def _rate(count, seconds):
+    return f"{count / seconds:>12,.0f}/s" if seconds else "           -"
+
+def benchmark(name, decode_document, documents):
+    gc.collect()
+    start = time.perf_counter()
+    objects = [decode_document(document) for document in documents]
+    decode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for obj in objects:
+        obj.to_dict()
+    encode = time.perf_counter() - start
+    del objects
+
+    # memory held by the decoded objects, measured apart from the timings
+    gc.collect()
+    tracemalloc.start()
+    objects = [decode_document(document) for document in documents]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+
+    count = len(documents)
+    print(f"{name:<15} decode {_rate(count, decode)}  encode {_rate(count, encode)}  {held / count:>8,.0f} bytes/object")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000, help="Documents per model")
+    parser.add_argument("--sources", type=int, default=2, help="Sources per server document")
+    parser.add_argument("--baseline", help="Git revision of the models to compare with, default: before models/codec.py")
+    parser.add_argument("--no-baseline", action="store_true", help="Only run the current models")
+    args = parser.parse_args()
+
+    servers = [server_document(index, args.sources) for index in range(args.count)]
+    clusters = [cluster_document(index) for index in range(args.count)]
+    print("current models")
+    benchmark("Server", Server.from_dict, servers)
+    benchmark("Server loaded", lambda document: load(Server.from_dict(document)), servers)
+    benchmark("Cluster", Cluster.from_dict, clusters)
+    benchmark("Cluster loaded", lambda document: load(Cluster.from_dict(document)), clusters)
+
+    if args.no_baseline:
+        return
+    revision = args.baseline or default_baseline()
+    BaselineServer, BaselineCluster = baseline_models(revision)
+    print(f"baseline models at {_git('rev-parse', '--short', revision).decode().strip()}")
+    benchmark("Server", BaselineServer.from_dict, servers)
+    benchmark("Cluster", BaselineCluster.from_dict, clusters)
+
+if __name__ == "__main__":
+    main()
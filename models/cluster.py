@@ -3,10 +3,16 @@ from typing import Any, List, Dict, Optional, Union
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 
-from models.network import NetworkInterface, create_network
+from models.codec import codec, empty_dict_if_empty, parse_datetime
+from models.lazy import LazyDict
+from models.network import NetworkInterface, create_network, decode_networks, encode_networks
 
 
-@dataclass
+@codec(
+    decoders={"networks": decode_networks, "last_updated": parse_datetime},
+    encoders={"additional_info": empty_dict_if_empty, "networks": encode_networks},
+)
+@dataclass(slots=True)
 class Source:
     env_config: Optional[str]= None
     owners: Optional[List[str]] = None
@@ -15,38 +21,6 @@ class Source:
     networks: Optional[List[NetworkInterface]] = None
     last_updated: datetime = datetime.now(timezone.utc)
 
-    def to_dict(self):
-        result = {
-            "env_config": self.env_config,
-            "owners": self.owners,
-            "cilium_cluster_id": self.cilium_cluster_id,
-            "additional_info": self.additional_info if self.additional_info else {},
-            "networks": ([network.to_dict() for network in self.networks] if self.networks else None),
-            "last_updated": self.last_updated,
-        }
-        return {key: value for key, value in result.items() if value is not None}
-        
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Source':
-        networks = [create_network(network_data) for network_data in data["networks"]] if data.get("networks") else None
-        
-        last_updated = None
-        if data.get("last_updated") and isinstance(data["last_updated"], str):
-            try:
-                last_updated = datetime.fromisoformat(data["last_updated"])
-            except ValueError:
-                last_updated = None
-
-        return cls(
-            env_config=data.get("env_config"),
-            owners=data.get("owners"),
-            cilium_cluster_id=data.get("cilium_cluster_id"),
-            additional_info=data.get("additional_info"),
-            networks=networks,
-            last_updated=last_updated
-        )
-    
     def refresh_last_updated(self) -> None:
         self.last_updated = datetime.now(timezone.utc)
           
@@ -58,7 +32,23 @@ class Source:
     #         f"<Source(networks={self.networks}, env_config={self.env_config}, owners={self.owners}, cilium_cluster_id={self.cilium_cluster_id}, additional_info={self.additional_info}, last_updated={self.last_updated})>"
     #     )
 
-@dataclass
+def decode_sources(sources: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Source]]:
+    # every source is built on first access, see models.lazy
+    return LazyDict(sources, Source.from_dict) if sources else None
+
+def encode_sources(sources: Optional[Dict[str, Source]]) -> Optional[Dict[str, Dict[str, Any]]]:
+    if isinstance(sources, LazyDict):
+        return sources.encode() if sources else None
+    return {key: source.to_dict() for key, source in sources.items()} if sources else None
+
+@codec(
+    decoders={"networks": decode_networks, "sources": decode_sources, "last_updated": parse_datetime},
+    encoders={
+        "additional_info": empty_dict_if_empty, "networks": encode_networks, "sources": encode_sources,
+        "last_updated": datetime.isoformat,
+    },
+)
+@dataclass(slots=True)
 class Cluster:
     cluster_id: str
     cluster_name: Optional[str] = None
@@ -78,48 +68,6 @@ class Cluster:
         if self.env_config is None:
             self.env_config = self.cluster_id
 
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Cluster':
-        networks = [create_network(network_data) for network_data in data["networks"]] if data.get("networks") else None
-        sources = {key: Source.from_dict(source_data) for key, source_data in data["sources"].items()} if data.get("sources") else None
-        if data.get("cluster_id") is None and data.get("env_config") is not None:
-            data["cluster_id"] = data["env_config"]
-        elif data.get("env_config") is None and data.get("cluster_id") is not None:
-            data["env_config"] = data["cluster_id"]
-            
-        last_updated = None
-        if data.get("last_updated") and isinstance(data["last_updated"], str):
-            try:
-                last_updated = datetime.fromisoformat(data["last_updated"])
-            except ValueError:
-                last_updated = None
-            
-        return cls(
-            cluster_id=data.get("cluster_id"),
-            cluster_name=data.get("cluster_name"),
-            env_config=data.get("env_config"),
-            owners=data.get("owners"),
-            cilium_cluster_id=data.get("cilium_cluster_id"),
-            additional_info=data.get("additional_info"),
-            networks=networks,
-            sources=sources,
-            last_updated=last_updated
-        )
-    
-    def to_dict(self):
-        result = {
-            "cluster_id": self.cluster_id,
-            "cluster_name": self.cluster_name,
-            "env_config": self.env_config,
-            "owners": self.owners,
-            "cilium_cluster_id": self.cilium_cluster_id,
-            "additional_info": self.additional_info if self.additional_info else {},
-            "networks": ([network.to_dict() for network in self.networks] if self.networks else None),
-            "sources": ({key: source.to_dict() for key, source in self.sources.items()} if self.sources else None),
-            "last_updated": self.last_updated.isoformat()
-        }
-        return {key: value for key, value in result.items() if value is not None} 
-
     @staticmethod
     def _create_source(source_data: Dict[str, Any]) -> Source:
         networks = [create_network(network_data) for network_data in source_data["networks"]] if source_data.get("networks") else None
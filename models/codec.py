@@ -0,0 +1,94 @@
+from abc import update_abstractmethods
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+# =============================================================================
+# Generated from_dict / to_dict
+# =============================================================================
+# The models are built for every document a page lists. Like dataclasses does for
+# __init__, their conversions are compiled once per class into straight-line
+# functions instead of walking the fields on every call.
+def _compile(name: str, lines: list, namespace: Dict[str, Any]) -> Callable:
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+def make_from_dict(cls, decoders: Dict[str, Callable]) -> Callable:
+    """
+    from_dict(data) passing data.get(<field>) for every field, through its decoder when it has one.
+
+    The arguments are positional, in the order of the fields, which the dataclass __init__ binds fastest.
+    """
+    namespace, arguments = {}, []
+    for field in fields(cls):
+        value = f"get({field.name!r})"
+        if field.name in decoders:
+            namespace[f"_decode_{field.name}"] = decoders[field.name]
+            value = f"_decode_{field.name}({value})"
+        arguments.append(value)
+    lines = [
+        "def from_dict(cls, data):",
+        "    get = data.get",
+        f"    return cls({', '.join(arguments)})",
+    ]
+    return classmethod(_compile("from_dict", lines, namespace))
+
+def make_to_dict(cls, encoders: Dict[str, Callable], drop_none: bool) -> Callable:
+    """to_dict() of every field in declaration order, through its encoder when it has one."""
+    namespace, values = {}, []
+    for field in fields(cls):
+        value = f"self.{field.name}"
+        if field.name in encoders:
+            namespace[f"_encode_{field.name}"] = encoders[field.name]
+            value = f"_encode_{field.name}({value})"
+        values.append((field.name, value))
+
+    if not drop_none:
+        items = ", ".join(f"{name!r}: {value}" for name, value in values)
+        return _compile("to_dict", ["def to_dict(self):", f"    return {{{items}}}"], namespace)
+
+    lines = ["def to_dict(self):", "    result = {}"]
+    for name, value in values:
+        lines += [
+            f"    value = {value}",
+            "    if value is not None:",
+            f"        result[{name!r}] = value",
+        ]
+    lines.append("    return result")
+    return _compile("to_dict", lines, namespace)
+
+def codec(decoders: Optional[Dict[str, Callable]] = None, encoders: Optional[Dict[str, Callable]] = None,
+          drop_none: bool = True):
+    """
+    Class decorator adding the generated from_dict and to_dict to a dataclass.
+
+    :param decoders: {field: function of the stored value}, the others are taken as they are
+    :param encoders: {field: function of the attribute}, the others are written as they are
+    :param drop_none: Leave out the fields whose encoded value is None
+    """
+    def decorator(cls):
+        cls.from_dict = make_from_dict(cls, decoders or {})
+        cls.to_dict = make_to_dict(cls, encoders or {}, drop_none)
+        # the fields models.lazy.load() looks at
+        cls._decoded_fields = tuple(decoders or ())
+        # from_dict and to_dict implement the abstract methods of NetworkInterface
+        return update_abstractmethods(cls)
+    return decorator
+
+# =============================================================================
+# Field conversions shared by the models
+# =============================================================================
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """Datetime of an ISO string, None for anything else."""
+    if value and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+def none_if_empty(value: Any) -> Any:
+    return value if value else None
+
+def empty_dict_if_empty(value: Any) -> Any:
+    return value if value else {}
@@ -0,0 +1,180 @@
+from collections.abc import Mapping, MutableMapping, MutableSequence
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# =============================================================================
+# Lazily decoded containers
+# =============================================================================
+# The list pages only show top-level fields, decoding the networks and sources of
+# every document is wasted work. These containers keep the stored list or dict and
+# build a model only when an item is read. Encoding them writes the items never read
+# back as they were stored, and returns the stored container itself when no item was
+# read or changed.
+_PENDING = object()
+
+class LazyList(MutableSequence):
+    """List of the models `decode` builds from the stored items, on first access."""
+
+    __slots__ = ("_raw", "_items", "_owned", "_decode")
+
+    def __init__(self, raw: List[Any], decode: Callable[[Any], Any]):
+        self._raw = raw
+        # the decoded items, _PENDING where not decoded yet, None until an item is read
+        self._items: Optional[List[Any]] = None
+        self._owned = False
+        self._decode = decode
+
+    def _item(self, index: int) -> Any:
+        items = self._items
+        if items is None:
+            items = self._items = [_PENDING] * len(self._raw)
+        item = items[index]
+        if item is _PENDING:
+            item = items[index] = self._decode(self._raw[index])
+        return item
+
+    def _own(self) -> List[Any]:
+        # before the first change, so the stored list is never modified
+        if self._items is None:
+            self._items = [_PENDING] * len(self._raw)
+        if not self._owned:
+            self._raw = list(self._raw)
+            self._owned = True
+        return self._items
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self._raw)))]
+        return self._item(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self._raw)):
+            yield self._item(index)
+
+    def __setitem__(self, index, value):
+        items = self._own()
+        if isinstance(index, slice):
+            value = list(value)
+            self._raw[index] = [None] * len(value)
+        items[index] = value
+
+    def __delitem__(self, index):
+        items = self._own()
+        del self._raw[index]
+        del items[index]
+
+    def insert(self, index: int, value: Any) -> None:
+        items = self._own()
+        self._raw.insert(index, None)
+        items.insert(index, value)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (LazyList, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def load(self) -> None:
+        """Decode every item, see load()."""
+        items, decode = self._items, self._decode
+        if items is None:
+            items = self._items = [decode(raw) for raw in self._raw]
+        else:
+            for index, item in enumerate(items):
+                if item is _PENDING:
+                    items[index] = decode(self._raw[index])
+        for item in items:
+            load(item)
+
+    def encode(self) -> List[Any]:
+        """The stored list, with the items that were read encoded again with to_dict()."""
+        if self._items is None:
+            return self._raw
+        return [raw if item is _PENDING else item.to_dict() for raw, item in zip(self._raw, self._items)]
+
+class LazyDict(MutableMapping):
+    """Dict of the models `decode` builds from the stored values, on first access."""
+
+    __slots__ = ("_raw", "_items", "_owned", "_decode")
+
+    def __init__(self, raw: Dict[str, Any], decode: Callable[[Any], Any]):
+        self._raw = raw
+        # the decoded values by key
+        self._items: Dict[str, Any] = {}
+        self._owned = False
+        self._decode = decode
+
+    def _own(self) -> None:
+        # before the first change, so the stored dict is never modified
+        if not self._owned:
+            self._raw = dict(self._raw)
+            self._owned = True
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._raw
+
+    def __getitem__(self, key: str) -> Any:
+        items = self._items
+        if key in items:
+            return items[key]
+        value = items[key] = self._decode(self._raw[key])
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._own()
+        self._raw[key] = None
+        self._items[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        self._own()
+        del self._raw[key]
+        self._items.pop(key, None)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def load(self) -> None:
+        """Decode every value, see load()."""
+        items, decode = self._items, self._decode
+        for key, raw in self._raw.items():
+            item = items.get(key)
+            if item is None:
+                item = items[key] = decode(raw)
+            load(item)
+
+    def encode(self) -> Dict[str, Any]:
+        """The stored dict, with the values that were read encoded again with to_dict()."""
+        items = self._items
+        if not items:
+            return self._raw
+        return {key: items[key].to_dict() if key in items else raw for key, raw in self._raw.items()}
+
+def load(obj: Any) -> Any:
+    """
+    Decode every lazy container of a model now, recursively, and return the model.
+
+    For the models built from request data: decoding errors are raised right away,
+    and to_dict() encodes every network and source again, with all of their fields.
+    """
+    # only the fields with a decoder (see models.codec) are built lazily by from_dict
+    for name in getattr(type(obj), "_decoded_fields", ()):
+        value = getattr(obj, name)
+        # exact type checks, isinstance() of the collections.abc subclasses is slow
+        if type(value) is LazyList or type(value) is LazyDict:
+            value.load()
+    return obj
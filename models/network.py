@@ -2,8 +2,13 @@ from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Type, Union
 from abc import ABC, abstractmethod
 
+from models.codec import codec
+from models.lazy import LazyList
+
 class NetworkInterface(ABC):
-    
+    # the network models are slotted, an empty __slots__ keeps a __dict__ from coming back
+    __slots__ = ()
+
     @abstractmethod
     def get_name(self) -> str:
         pass
@@ -31,7 +36,8 @@ class NetworkInterface(ABC):
         if self.type is None:
             raise ValueError("type cannot be None")
 
-@dataclass
+@codec(drop_none=False)
+@dataclass(slots=True)
 class IPNetwork(NetworkInterface):
     name: str
     type: str
@@ -45,29 +51,11 @@ class IPNetwork(NetworkInterface):
     def get_type(self) -> str:
         return self.type
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "name": self.name,
-            "type": self.type,
-            "ip": self.ip,
-            "subnet_mask": self.subnet_mask,
-            "mac": self.mac,
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'IPNetwork':
-        return cls(
-            name=data.get("name"),
-            type=data.get("type"),
-            ip=data.get("ip"),
-            subnet_mask=data.get("subnet_mask"),
-            mac=data.get("mac"),
-        )
-
     def __repr__(self) -> str:
         return self.to_dict().__repr__()
 
-@dataclass
+@codec(drop_none=False)
+@dataclass(slots=True)
 class CIDRNetwork(NetworkInterface):
     name: str
     type: str
@@ -79,25 +67,11 @@ class CIDRNetwork(NetworkInterface):
     def get_type(self) -> str:
         return self.type
 
-    def to_dict(self) -> Dict[str, Union[str, List[str], None]]:
-        return {
-            "name": self.name,
-            "type": self.type,
-            "cidrs": self.cidrs
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Union[str, List[str], None]]) -> 'CIDRNetwork':
-        return cls(
-            name=data.get("name"),
-            type=data.get("type"),
-            cidrs=data.get("cidrs")
-        )
-
     def __repr__(self) -> str:
         return self.to_dict().__repr__()
 
-@dataclass
+@codec(drop_none=False)
+@dataclass(slots=True)
 class HostSubnetNetwork(NetworkInterface):
     name: str
     type: str
@@ -111,25 +85,6 @@ class HostSubnetNetwork(NetworkInterface):
     def get_type(self) -> str:
         return self.type
 
-    def to_dict(self) -> Dict[str, Union[str, List[str], None]]:
-        return {
-            "name": self.name,
-            "type": self.type,
-            "hostname": self.hostname,
-            "egress_cidrs": self.egress_cidrs,
-            "egress_ips": self.egress_ips
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'HostSubnetNetwork':
-        return cls(
-            name=data.get("name"),
-            type=data.get("type"),
-            hostname=data.get("hostname"),
-            egress_cidrs=data.get("egress_cidrs"),
-            egress_ips=data.get("egress_ips")
-        )
-
     def __repr__(self) -> str:
         return self.to_dict().__repr__()
 
@@ -149,4 +104,13 @@ def create_network(data: Dict[str, Any]) -> NetworkInterface:
     if not network_class:
         raise ValueError(f"Unknown network type: {network_type}")
 
-    return network_class.from_dict(data)
\ No newline at end of file
+    return network_class.from_dict(data)
+
+def decode_networks(networks: Optional[List[Dict[str, Any]]]) -> Optional[List[NetworkInterface]]:
+    # every network is built on first access, see models.lazy
+    return LazyList(networks, create_network) if networks else None
+
+def encode_networks(networks: Optional[List[NetworkInterface]]) -> Optional[List[Dict[str, Any]]]:
+    if isinstance(networks, LazyList):
+        return networks.encode() if networks else None
+    return [network.to_dict() for network in networks] if networks else None
\ No newline at end of file
@@ -3,10 +3,16 @@ from typing import Optional, List, Dict, Any, Union
 from datetime import datetime, timezone
 from dataclasses import dataclass
 
-from models.network import NetworkInterface, create_network
+from models.codec import codec, none_if_empty, parse_datetime
+from models.lazy import LazyDict
+from models.network import NetworkInterface, decode_networks, encode_networks
 
 
-@dataclass
+@codec(
+    decoders={"networks": decode_networks, "last_updated": parse_datetime},
+    encoders={"additional_info": none_if_empty, "networks": encode_networks},
+)
+@dataclass(slots=True)
 class Source:
     hostname: Optional[str] = None
     serial_number: Optional[str] = None
@@ -24,63 +30,26 @@ class Source:
     networks: Optional[List[NetworkInterface]] = None
     last_updated: datetime = datetime.now(timezone.utc)
 
-    def to_dict(self) -> Dict[str, Any]:
-        result = {
-            "hostname": self.hostname,
-            "serial_number": self.serial_number,
-            "location": self.location,
-            "datacenter": self.datacenter,
-            "room": self.room,
-            "rack": self.rack,
-            "unit": self.unit,
-            "os": self.os,
-            "as_number": self.as_number,
-            "owner": self.owner,
-            "cluster_id": self.cluster_id,
-            "env_config": self.env_config,
-            "additional_info": self.additional_info if self.additional_info else None,
-            "networks": ([network.to_dict() for network in self.networks] if self.networks else None),
-            "last_updated": self.last_updated,
-        }
-        # Remove keys with None values
-        return {key: value for key, value in result.items() if value is not None}
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> "Source":
-        networks = [create_network(network_data) for network_data in data["networks"]] if data.get("networks") else None
-        
-        last_updated = None
-        if data.get("last_updated") and isinstance(data["last_updated"], str):
-            try:
-                last_updated = datetime.fromisoformat(data["last_updated"])
-            except ValueError:
-                last_updated = None
-
-        return Source(
-            hostname=data.get("hostname"),
-            serial_number=data.get("serial_number"),
-            location=data.get("location"),
-            datacenter=data.get("datacenter"),
-            room=data.get("room"),
-            rack=data.get("rack"),
-            unit=data.get("unit"),
-            os=data.get("os"),
-            as_number=data.get("as_number"),
-            owner=data.get("owner"),
-            cluster_id=data.get("cluster_id"),
-            env_config=data.get("env_config"),
-            additional_info=data.get("additional_info"),
-            networks=(networks if networks else None),
-            last_updated=last_updated
-        )
-    
     def refresh_last_updated(self) -> None:
         self.last_updated = datetime.now(timezone.utc)
         
     def __repr__(self) -> str:
         return self.to_dict().__repr__()
 
-@dataclass
+def decode_sources(sources: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Source]]:
+    # every source is built on first access, see models.lazy
+    return LazyDict(sources, Source.from_dict) if sources else None
+
+def encode_sources(sources: Optional[Dict[str, Source]]) -> Optional[Dict[str, Dict[str, Any]]]:
+    if isinstance(sources, LazyDict):
+        return sources.encode() if sources else None
+    return {key: source.to_dict() for key, source in sources.items()} if sources else None
+
+@codec(
+    decoders={"networks": decode_networks, "sources": decode_sources, "last_updated": parse_datetime},
+    encoders={"additional_info": none_if_empty, "networks": encode_networks, "sources": encode_sources},
+)
+@dataclass(slots=True)
 class Server:
     server_id: str
     hostname: Optional[str] = None
@@ -120,59 +89,6 @@ class Server:
         else:
             self.sources = { source_name: Source.from_dict(source_data)}
 
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Server':
-        # Create networks and sources based on data
-        networks = [create_network(network_data) for network_data in data["networks"]] if data.get("networks") else None
-        sources = {key: Source.from_dict(source_data) for key, source_data in data["sources"].items()} if data.get("sources") else None
-        last_updated = None
-        if data.get("last_updated") and isinstance(data["last_updated"], str):
-            try:
-                last_updated = datetime.fromisoformat(data["last_updated"])
-            except ValueError:
-                last_updated = None
-        return cls(
-            server_id=data.get("server_id"),
-            hostname=data.get("hostname"),
-            serial_number=data.get("serial_number"),
-            location=data.get("location"),
-            datacenter=data.get("datacenter"),
-            room=data.get("room"),
-            rack=data.get("rack"),
-            unit=data.get("unit"),
-            os=data.get("os"),
-            as_number=data.get("as_number"),
-            owner=data.get("owner"),
-            cluster_id=data.get("cluster_id"),
-            env_config=data.get("env_config"),
-            additional_info=data.get("additional_info"),
-            networks=(networks if networks else None),
-            sources=(sources if sources else None),
-            last_updated=last_updated
-        )
-
-    def to_dict(self) -> Dict[str, Any]:
-        result = {
-            "server_id": self.server_id,
-            "hostname": self.hostname,
-            "serial_number": self.serial_number,
-            "location": self.location,
-            "datacenter": self.datacenter,
-            "room": self.room,
-            "rack": self.rack,
-            "unit": self.unit,
-            "os": self.os,
-            "as_number": self.as_number,
-            "owner": self.owner,
-            "cluster_id": self.cluster_id,
-            "env_config": self.env_config,
-            "additional_info": self.additional_info if self.additional_info else None,
-            "networks": ([network.to_dict() for network in self.networks] if self.networks else None),
-            "sources": ({key: source.to_dict() for key, source in self.sources.items()} if self.sources else None),
-            "last_updated": self.last_updated,
-        }
-        return {key: value for key, value in result.items() if value is not None}
-    
     # not in-used
     def sort_dict_by_order(self, input_dict, predefined_order):
         """
@@ -1,15 +1,43 @@
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
-from bson import Code
+from typing import Any, Dict, List, Optional
 from pymongo.errors import PyMongoError
 from flask import current_app
 from flask import logging
 from models.cluster import Cluster, Source
-from utils.database import clusters_collection
+from models.lazy import load
+from utils.database import clusters_collection, servers_collection
+from utils.config import inconsistency_stream_batch_size
+from utils.inconsistency import CheckProfile, InconsistencyPipeline, set_stage
+from utils.bulk import bulk_set_source
+from utils.revision import VERSION_PROJECTION, composite_version
+from utils.pagination import keyset_page
+from utils.projection import model_projection
+from utils.validation import CLUSTER_SOURCE_SCHEMA
+from services import DataNotFoundError
+from services.stats import invalidate_stats
+from services.overlap import invalidate_overlaps
+
+# The stored fields of the Cluster model, read-only endpoints return them without the model
+# round trip. The expressions normalize them like Cluster.from_dict().to_dict() does: the
+# cluster_id and env_config of legacy clusters fill in for each other and additional_info
+# defaults to {}. Other fields are returned as they are stored.
+CLUSTER_PROJECTION = {
+    **model_projection(Cluster),
+    "cluster_id": {"$ifNull": ["$cluster_id", "$env_config"]},
+    "env_config": {"$ifNull": ["$env_config", "$cluster_id"]},
+    "additional_info": {"$ifNull": ["$additional_info", {"$literal": {}}]},
+}
+
+# Fields of the member servers listed on the cluster detail page
+SERVER_SUMMARY_PROJECTION = {
+    "_id": 0, "server_id": 1, "hostname": 1, "has_inconsistencies": 1, "inconsistency_count": 1,
+    "revision": 1, "last_modified": 1,
+}
 
 class ClusterService:
     def __init__(self):
         self.collection = clusters_collection
+        self.inconsistencies = InconsistencyPipeline(self.collection)
 
     def create(self, cluster: Cluster):
         try:
@@ -17,6 +45,7 @@ class ClusterService:
             cluster_dict = cluster.to_dict()
             result = self.collection.insert_one(cluster_dict)
             cluster_id = cluster.cluster_id
+            self.refresh_inconsistencies({"_id": result.inserted_id})
             current_app.logger.info(f"Cluster {cluster_id} created successfully.")
             return cluster_id
 
@@ -28,20 +57,33 @@ class ClusterService:
             current_app.logger.error(f"Unexpected error occurred: {e}")
             raise
 
-    def get(self, cluster_id: str) -> Optional[Cluster]:
-        data = self.collection.find_one({"cluster_id": cluster_id})
-        if not data:
+    def get(self, cluster_id: str, projection: Optional[Dict] = None) -> Optional[Cluster]:
+        """Get a single cluster by ID, the raw projected document when a projection is given."""
+        data = self.collection.find_one({"cluster_id": cluster_id}, projection)
+        if data is None:
             return None
+        if projection:
+            return data
         return self._from_dict(data)
     
-    def get_all(self) -> Optional[list[Cluster]]:
-        data = self.collection.find()
+    def get_all(self, projection: Optional[Dict] = None) -> Optional[list[Cluster]]:
+        """Get all clusters, as raw projected documents when a projection is given."""
+        data = self.collection.find({}, projection)
         if not data:
             return None
+        if projection:
+            return list(data)
         return [ self._from_dict(d) for d in data ]
 
+    def get_page(self, limit: int, cursor: Optional[str] = None, projection: Optional[Dict] = None):
+        """One page of clusters in _id order and the cursor of the next page."""
+        documents, next_cursor = keyset_page(self.collection, {}, limit, cursor, projection)
+        if projection:
+            return documents, next_cursor
+        return [self._from_dict(doc) for doc in documents], next_cursor
+
     def update(self, cluster_id: str, updated_data: Cluster):
-        return self.collection.update_one({"cluster_id": cluster_id}, {"$set": updated_data.to_dict()})
+        return self._write({"cluster_id": cluster_id}, [set_stage(updated_data.to_dict())])
 
     # TODO: check the function of replace or create
     def upsert(self, cluster_id: str, updated_data: Cluster):
@@ -62,86 +104,119 @@ class ClusterService:
                     }
                 }
             })
-        result = clusters_collection.update_one(
-            {"cluster_id": cluster_id},
-            set_operations,
-            upsert=True
-        )
+        result = self._write({"cluster_id": cluster_id}, set_operations, upsert=True)
         return cluster_id, result
+
+    def patch(self, cluster_id: str, updated_data: Cluster):
+        """Patch a cluster by ID."""
+        data = updated_data.to_dict()
+        data["last_updated"] = datetime.now(timezone.utc).isoformat()
+        result = self._write({"cluster_id": cluster_id}, [set_stage(data)])
+        if result.matched_count == 0:
+            raise DataNotFoundError("Cluster not found")
+        return cluster_id
+
+    def _write(self, filter: Dict, pipeline: List[Dict], upsert: bool = False):
+        """
+        Write a cluster with a single update_one, which also refreshes its inconsistencies
+        when the backend can compute them inside the update.
+
+        :return: The UpdateResult, `upserted_id` tells a created cluster from an updated one
+        """
+        stages = self.inconsistencies.update_stages()
+        result = self.collection.update_one(filter, pipeline + (stages or []), upsert=upsert)
+        if result.matched_count == 0 and result.upserted_id is None:
+            return result
+        if stages is None:
+            self.refresh_inconsistencies({"_id": result.upserted_id} if result.upserted_id else filter)
+        else:
+            invalidate_stats()
+            invalidate_overlaps()
+        return result
     
     def delete(self, cluster_id: str):
         result = self.collection.delete_one({"cluster_id": cluster_id})
         if result.deleted_count == 0:
             return None
+        invalidate_stats()
+        invalidate_overlaps()
         return cluster_id
 
-    def find_network_inconsistencies(self, cluster_id: str, return_all: bool = True):
-        # Define the JavaScript function to compute inconsistencies
-        with open("utils/networkCheck.js") as f:
-            js_function = Code(f.read())
+    def bulk_update_source(self, source_name: str, updates: List[Dict[str, Any]]) -> Dict[str, List]:
+        """Replace the `source_name` source of many clusters in one bulk_write, see utils.bulk.bulk_set_source."""
+        def to_source(data: Dict[str, Any]) -> Dict[str, Any]:
+            CLUSTER_SOURCE_SCHEMA.check_valid(data)
+            source = load(Source.from_dict(data))
+            source.refresh_last_updated()
+            return source.to_dict()
+
+        result = bulk_set_source(self.collection, "cluster_id", source_name, updates, to_source)
+        if result["matched"]:
+            self.refresh_inconsistencies({"cluster_id": {"$in": result["matched"]}})
+        return result
 
-        # Define the aggregation pipeline
-        pipeline = [
-            {
-                "$match": {
-                    "cluster_id": cluster_id
-                }
-            },
-            {
-                "$addFields": {
-                    "inconsistencies": {
-                        "$function": {
-                            "body": js_function,
-                            "args": ["$networks", "$sources"],
-                            "lang": "js"
-                        }
-                    }
-                }
-            }
+    def find_network_inconsistencies(self, cluster_id: str, return_all: bool = True, profile: Optional[CheckProfile] = None):
+        return self.inconsistencies.find_one({"cluster_id": cluster_id}, return_all, profile)
+
+    def get_details(self, cluster_id: str, profile: Optional[CheckProfile] = None) -> Dict:
+        """
+        Everything the cluster detail page shows in one aggregation: the cluster with its
+        inconsistencies and its member servers with their inconsistency flags.
+        """
+        stages = [{"$lookup": {
+            "from": servers_collection.name, "localField": "cluster_id", "foreignField": "cluster_id",
+            "pipeline": [{"$sort": {"hostname": 1, "_id": 1}}, {"$project": SERVER_SUMMARY_PROJECTION}], "as": "servers",
+        }}]
+        return self.inconsistencies.find_one({"cluster_id": cluster_id}, profile=profile, stages=stages)
+
+    def get_details_version(self, cluster_id: str) -> Optional[Dict]:
+        """
+        Version of the detail page without building it, see composite_version(): the
+        versions of the cluster and of its member servers in page order, read with one
+        aggregation that runs no check, the same as the view computes from get_details().
+        None when the cluster does not exist.
+        """
+        stages = [
+            {"$match": {"cluster_id": cluster_id}},
+            {"$limit": 1},
+            {"$project": {**VERSION_PROJECTION, "cluster_id": 1}},
+            {"$lookup": {
+                "from": servers_collection.name, "localField": "cluster_id", "foreignField": "cluster_id",
+                "pipeline": [{"$sort": {"hostname": 1, "_id": 1}}, {"$project": VERSION_PROJECTION}], "as": "servers",
+            }},
         ]
-        
-        if not return_all:
-            pipeline.append({
-                "$match": {
-                    "inconsistencies.0": {"$exists": True}  # Only include documents with inconsistencies
-                }
-            })
+        versions = next(self.collection.aggregate(stages), None)
+        if versions is None:
+            return None
+        return composite_version([versions] + versions["servers"])
 
-        # Run the aggregation pipeline and return results
-        results = list(self.collection.aggregate(pipeline))
-        result = results[0] if results else {}
-        return result
+    def find_network_inconsistencies_all(self, profile: Optional[CheckProfile] = None):
+        """Clusters with inconsistencies, from the materialized results unless a non-default profile is given."""
+        return self.inconsistencies.find_all(profile)
 
-    def find_network_inconsistencies_all(self):
-        # Define the JavaScript function to compute inconsistencies
-        with open("utils/networkCheck.js") as f:
-            js_function = Code(f.read())
-        
-        # Define the aggregation pipeline
-        pipeline = [
-            {
-                "$addFields": {
-                    "inconsistencies": {
-                        "$function": {
-                            "body": js_function,
-                            "args": ["$networks", "$sources"],
-                            "lang": "js"
-                        }
-                    }
-                }
-            },
-            {
-                "$match": {
-                    "inconsistencies.0": {"$exists": True}  # Only include documents with inconsistencies
-                }
-            }
-        ]
+    def iter_network_inconsistencies_all(self, profile: Optional[CheckProfile] = None):
+        """Same as find_network_inconsistencies_all, streamed from the cursor with a small batch size."""
+        return self.inconsistencies.iter_all(profile, batch_size=inconsistency_stream_batch_size)
 
-        # Run the aggregation pipeline and return results
-        return list(self.collection.aggregate(pipeline))
+    def get_version(self, cluster_id: str) -> Optional[Dict]:
+        """{"revision", "last_modified"} of a cluster, None when it does not exist."""
+        return self.collection.find_one({"cluster_id": cluster_id}, VERSION_PROJECTION)
+
+    def refresh_inconsistencies(self, query: Dict):
+        """Recompute and store the inconsistencies of the clusters matching the query."""
+        invalidate_stats()
+        invalidate_overlaps()
+        self.inconsistencies.refresh(query)
+
+    def rebuild_inconsistencies(self):
+        """Backfill the materialized inconsistencies of every cluster."""
+        invalidate_stats()
+        invalidate_overlaps()
+        self.inconsistencies.rebuild()
 
     def count(self):
         return self.collection.count_documents({})
+
     # def upsert_source(self, cluster_id: str, source_name: str, networks: List[Dict]):
     #     cluster = self.collection.find_one({"cluster_id": cluster_id})
     #     if not cluster:
@@ -0,0 +1,99 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.config import inconsistency_stream_batch_size
+from utils.database import clusters_collection, servers_collection
+
+# Address kinds reported by the conflict detector
+ADDRESS_TYPES = ("ip", "mac")
+
+def _claims_stages(entity: str, id_field: str) -> List[Dict[str, Any]]:
+    """
+    Stages turning every document of one collection into one row per claimed address.
+
+    A row is {entity, entity_id, source, network, addresses: {type, value}}. `source` is
+    the name of the source that reported the network, or None for the merged `networks`.
+    """
+    return [
+        # the merged networks as a source named None, followed by every source
+        {"$project": {
+            "_id": 0,
+            "entity_id": "$" + id_field,
+            "claims": {"$concatArrays": [
+                [{"k": None, "v": {"networks": {"$ifNull": ["$networks", []]}}}],
+                {"$objectToArray": {"$ifNull": ["$sources", {}]}},
+            ]},
+        }},
+        {"$unwind": "$claims"},
+        {"$unwind": "$claims.v.networks"},
+        {"$project": {
+            "entity": {"$literal": entity},
+            "entity_id": 1,
+            "source": "$claims.k",
+            "network": "$claims.v.networks.name",
+            "addresses": {"$concatArrays": [
+                [
+                    {"type": "ip", "value": "$claims.v.networks.ip"},
+                    {"type": "mac", "value": {"$toLower": "$claims.v.networks.mac"}},
+                ],
+                {"$map": {
+                    "input": {"$ifNull": ["$claims.v.networks.egress_ips", []]},
+                    "as": "ip",
+                    "in": {"type": "ip", "value": "$$ip"},
+                }},
+            ]},
+        }},
+        {"$unwind": "$addresses"},
+        # drop networks without an ip or mac ($toLower turns a missing mac into "")
+        {"$match": {"addresses.value": {"$type": "string", "$ne": ""}}},
+    ]
+
+class ConflictService:
+    """Addresses claimed by more than one server or cluster."""
+
+    def __init__(self):
+        self.servers = servers_collection
+        self.clusters = clusters_collection
+
+    def pipeline(self, address_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        One aggregation over servers and clusters: $unwind every claimed address, then
+        $group by address so the inventory is read once instead of compared pairwise.
+        """
+        pipeline = _claims_stages("server", "server_id")
+        pipeline.append({"$unionWith": {"coll": self.clusters.name, "pipeline": _claims_stages("cluster", "cluster_id")}})
+        if address_type:
+            pipeline.append({"$match": {"addresses.type": address_type}})
+        pipeline += [
+            {"$group": {
+                "_id": "$addresses",
+                "entities": {"$addToSet": {"entity": "$entity", "entity_id": "$entity_id"}},
+                "claims": {"$push": {
+                    "entity": "$entity",
+                    "entity_id": "$entity_id",
+                    "source": "$source",
+                    "network": "$network",
+                }},
+            }},
+            # the same entity reporting an address from several sources is not a conflict
+            {"$match": {"entities.1": {"$exists": True}}},
+            {"$project": {
+                "_id": 0,
+                "type": "$_id.type",
+                "address": "$_id.value",
+                "entity_count": {"$size": "$entities"},
+                "claims": 1,
+            }},
+            {"$sort": {"type": 1, "address": 1}},
+        ]
+        return pipeline
+
+    def iter_conflicts(self, address_type: Optional[str] = None) -> Iterator[Dict]:
+        """Stream the conflicting addresses, optionally only one address type."""
+        if address_type and address_type not in ADDRESS_TYPES:
+            raise ValueError(f"Unknown address type: {address_type}")
+        return self.servers.aggregate(self.pipeline(address_type), allowDiskUse=True,
+                                      batchSize=inconsistency_stream_batch_size)
+
+    def find_conflicts(self, address_type: Optional[str] = None) -> List[Dict]:
+        """Conflicting addresses with every entity, source and network that claims them."""
+        return list(self.iter_conflicts(address_type))
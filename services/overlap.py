@@ -0,0 +1,64 @@
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+from utils.cidr_overlap import cluster_ranges, find_overlaps, server_ranges
+from utils.config import overlap_ttl
+from utils.database import clusters_collection, servers_collection
+from utils.revision import collection_generation
+
+# Overlaps shared by every request of this process, with the generation of the data they
+# were computed from. invalidate_overlaps() drops them at once for writes of this process.
+_cache: Dict[str, object] = {"overlaps": None, "generation": None, "expires_at": 0.0}
+_lock = Lock()
+
+OVERLAP_TYPES = ("cluster_cluster", "cluster_server")
+
+def invalidate_overlaps():
+    """Drop the cached overlaps, every write to servers or clusters calls this."""
+    _cache["overlaps"] = None
+
+class OverlapService:
+    def __init__(self):
+        self.servers = servers_collection
+        self.clusters = clusters_collection
+
+    def find_overlaps(self, overlap_type: Optional[str] = None) -> List[Dict]:
+        """
+        CIDR overlaps between clusters and with server IPs.
+
+        Cached until the next write: every request compares the cache with the generation
+        of servers and clusters (utils.revision.collection_generation), so writes made by
+        other processes are seen as well. Writes made around the app without setting
+        last_modified are seen after at most [overlap] ttl seconds.
+        """
+        if overlap_type and overlap_type not in OVERLAP_TYPES:
+            raise ValueError(f"Unknown overlap type: {overlap_type}")
+
+        generation = collection_generation(self.servers, self.clusters)
+        overlaps = self._cached(generation)
+        if overlaps is None:
+            with _lock:
+                # another request may have refreshed the cache while we were waiting
+                overlaps = self._cached(generation)
+                if overlaps is None:
+                    # the generation is read before the computation, a write during it
+                    # leaves a generation behind and is recomputed on the next request
+                    overlaps = self._compute()
+                    _cache.update(overlaps=overlaps, generation=generation, expires_at=time.monotonic() + overlap_ttl)
+
+        if overlap_type:
+            return [overlap for overlap in overlaps if overlap["type"] == overlap_type]
+        return overlaps
+
+    @staticmethod
+    def _cached(generation: tuple) -> Optional[List[Dict]]:
+        if _cache["generation"] != generation or time.monotonic() >= _cache["expires_at"]:
+            return None
+        return _cache["overlaps"]
+
+    def _compute(self) -> List[Dict]:
+        projection = {"_id": 0, "networks": 1, "sources": 1}
+        clusters = cluster_ranges(self.clusters.find({}, {**projection, "cluster_id": 1}))
+        servers = server_ranges(self.servers.find({}, {**projection, "server_id": 1}))
+        return list(find_overlaps(clusters, servers))
@@ -1,20 +1,55 @@
-from typing import Dict, Optional
-from bson import Code
+from typing import Any, Dict, List, Optional
 from flask import Blueprint, request, jsonify
 from flask_deprecate import deprecate_route
 from flask import current_app
 from bson.objectid import ObjectId
 from datetime import datetime, timezone
 from services import AlreadyExistError, DataNotFoundError
-from utils.database import servers_collection
+from utils.database import clusters_collection, servers_collection
+from utils.config import inconsistency_stream_batch_size, search_count_limit
+from utils.inconsistency import CheckProfile, InconsistencyPipeline, set_stage
+from utils.bulk import bulk_set_source
+from utils.revision import VERSION_PROJECTION, composite_version
+from utils.pagination import encode_cursor, keyset_page
+from utils.projection import model_projection
+from utils.search import SEARCH_COLLATION, build_search_query, count_matches
+from utils.validation import SERVER_SCHEMA, SERVER_SOURCE_SCHEMA, ValidationError
+from services.stats import invalidate_stats
+from services.overlap import invalidate_overlaps
+from models.lazy import load
 from models.server import Server, Source
-from pymongo.errors import PyMongoError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 
 servers_api = Blueprint('servers_api', __name__)
 
+# The stored fields of the Server model, read-only endpoints return them without the model
+# round trip. The expressions normalize them like Server.from_dict().to_dict() does: the
+# cluster_id and env_config of legacy servers fill in for each other and an empty
+# additional_info is left out. Other fields are returned as they are stored, a stored null
+# as null and last_updated as it was written (a date or an ISO string).
+SERVER_PROJECTION = {
+    **model_projection(Server),
+    "cluster_id": {"$ifNull": ["$cluster_id", "$env_config"]},
+    "env_config": {"$ifNull": ["$env_config", "$cluster_id"]},
+    "additional_info": {"$cond": [{"$eq": [{"$ifNull": ["$additional_info", {"$literal": {}}]}, {"$literal": {}}]},
+                                  "$$REMOVE", "$additional_info"]},
+}
+
+# Fields of the cluster shown on the server detail page
+CLUSTER_SUMMARY_PROJECTION = {
+    "_id": 0, "cluster_id": 1, "cluster_name": 1, "env_config": 1, "owners": 1,
+    "has_inconsistencies": 1, "inconsistency_count": 1, "revision": 1, "last_modified": 1,
+}
+
+# cluster_id to look the cluster up with: False, which no cluster_id is, for servers
+# without a cluster_id; null would match every server that has none
+CLUSTER_KEY = {"$cond": [{"$eq": [{"$type": "$cluster_id"}, "string"]}, "$cluster_id", False]}
+
 class ServerService:
     def __init__(self):
         self.collection = servers_collection
+        self.inconsistencies = InconsistencyPipeline(self.collection)
 
     def create(self, server: Server):
         """Create a new server."""
@@ -28,6 +63,7 @@ class ServerService:
             )
             if result.matched_count != 0 and result.upserted_id is None:
                 raise AlreadyExistError(f"Server {data.get('server_id')} already exist.")
+            self.refresh_inconsistencies({"_id": result.upserted_id})
             current_app.logger.info(f"Server {data.get('server_id')} created successfully.")
             return data.get("server_id")
         except PyMongoError as e:
@@ -38,47 +74,66 @@ class ServerService:
             raise
 
     # okk
-    def get(self, server_id: str):
-        """Get a single server by ID."""
-        data = self.collection.find_one({"server_id": server_id})
-        if not data:
+    def get(self, server_id: str, projection: Optional[Dict] = None):
+        """Get a single server by ID, the raw projected document when a projection is given."""
+        data = self.collection.find_one({"server_id": server_id}, projection)
+        if data is None:
             return None
+        if projection:
+            return data
         server = self._from_dict(data)
         return server
 
     # okk
-    def get_all(self):
-        """Get all servers."""
-        servers = list(self.collection.find())
+    def get_all(self, projection: Optional[Dict] = None):
+        """Get all servers, as raw projected documents when a projection is given."""
+        servers = list(self.collection.find({}, projection))
         if not servers:
             return None
+        if projection:
+            return servers
         servers = [self._from_dict(server) for server in servers]
         return servers
 
-    def get_paginated(self, page, limit, search = None, search_columns = None):
-        """Fetch paginated server data."""
-        skip = (page - 1) * limit
-        query = {}
-        if search.strip():
-            query['hostname'] = {'$regex': f'.*{search}.*', '$options': 'i'}
-        for column, value in search_columns.items():
-            if value.strip():
-                query[column] = {'$regex': f'.*{value}.*', '$options': 'i'}
-            
-        cursor = servers_collection.find(query).skip(skip).limit(limit)
-        total_count = servers_collection.count_documents({})
-        servers = [self._from_dict(doc) for doc in cursor]
-        return servers, total_count
+    def get_page(self, limit: int, cursor: Optional[str] = None, projection: Optional[Dict] = None):
+        """One page of servers in _id order and the cursor of the next page."""
+        documents, next_cursor = keyset_page(self.collection, {}, limit, cursor, projection)
+        if projection:
+            return documents, next_cursor
+        return [self._from_dict(doc) for doc in documents], next_cursor
+
+    def get_paginated(self, page, limit, search = None, search_columns = None, cursor = None, sort_field = "_id", direction = 1):
+        """
+        Fetch paginated server data, from the cursor of the previous page when one is given.
+
+        Search terms are case-insensitive prefixes served by the collation indexes of
+        utils/search.py. The filtered count stops at `search_count_limit`. Pages are
+        sorted on (sort_field, _id), which one of those indexes serves for SORT_COLUMNS.
+        """
+        query = build_search_query(search, search_columns)
+
+        total_count = self.collection.estimated_document_count()
+        filtered_count = count_matches(self.collection, query, search_count_limit) if query else total_count
+        if cursor or page == 1:
+            documents, next_cursor = keyset_page(self.collection, query, limit, cursor, sort_field=sort_field,
+                                                 direction=direction, collation=SEARCH_COLLATION)
+        else:
+            # jumping straight to a page without the cursor of the page before it
+            skip = (page - 1) * limit
+            sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+            documents = list(self.collection.find(query, collation=SEARCH_COLLATION).sort(sort).skip(skip).limit(limit + 1))
+            next_cursor = encode_cursor(documents[limit - 1], sort_field, direction) if len(documents) > limit else None
+            documents = documents[:limit]
+        servers = [self._from_dict(doc) for doc in documents]
+        return servers, total_count, filtered_count, next_cursor
     
     def update(self, server_id: str, server_data: Server):
         """Update a server by ID."""
-        server = find_server_by_id(server_id)
-        if not server:
-            return DataNotFoundError("Server not found")
-        
         data = server_data.to_dict()
         data["last_updated"] = datetime.now(timezone.utc).isoformat()
-        servers_collection.update_one({"server_id": server_id}, {"$set": data})
+        result = self._write({"server_id": server_id}, [set_stage(data)])
+        if result.matched_count == 0:
+            raise DataNotFoundError("Server not found")
         return server_id
     
     # TODO: check the function of replace or create
@@ -100,7 +155,13 @@ class ServerService:
                 filter = {"$or": [{"server_id": server_id}, {"hostname": hostname}]}
             else:
                 raise ValueError("Server ID or hostname is required")
-            
+
+        result = self._write(filter, self._upsert_pipeline(server_id, data), upsert=True)
+        return server_id, result
+
+    @staticmethod
+    def _upsert_pipeline(server_id: Optional[str], data: Dict) -> List[Dict]:
+        """Update pipeline of upsert(): set the fields and replace the given sources, keeping the others."""
         set_operations = [
             {
                 "$set": { key: value for key, value in data.items() if key != "sources"}
@@ -137,30 +198,145 @@ class ServerService:
                     }
                 }
             })
-        result = servers_collection.update_one(
-            filter,
-            set_operations,
-            upsert=True
-        )
-        return server_id, result
+        return set_operations
+
+    # Fields compared to decide whether a bulk item changes the stored server
+    _BULK_IGNORED_FIELDS = ("last_updated", "server_id", "sources")
+
+    def bulk_upsert(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create or update many servers by server_id with one unordered bulk_write.
+
+        Every item is validated against SERVER_SCHEMA first, invalid ones are
+        reported without reaching the database. The valid ones go through the same
+        update pipeline as upsert(), which keeps a server exactly as it is when the
+        item would not change it, so only the changed servers count as modified.
+
+        Nothing is read before the write. The created servers come from upserted_ids.
+        When modified_count tells that some but not all of the matched servers changed,
+        the changed ones are read back by the last_updated this call wrote.
+
+        :return: One result per item, in order: {"index", "server_id", "status"[, "error", "errors"]}
+                 with status "created", "updated", "unchanged" or "error", "errors" lists
+                 the {"path", "error"} of an invalid item
+        """
+        results = [{"index": index, "server_id": None, "status": None} for index in range(len(items))]
+        valid = {}
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict) or not item.get("server_id"):
+                    raise ValueError("server_id is required")
+                server_id = str(item["server_id"])
+                results[index]["server_id"] = server_id
+                if server_id in valid:
+                    raise ValueError(f"duplicate server_id, first given at index {valid[server_id][0]}")
+                SERVER_SCHEMA.check_valid(item)
+                data = load(Server.from_dict(item)).to_dict()
+            except ValidationError as e:
+                results[index].update(status="error", error=str(e), errors=e.errors)
+                continue
+            except Exception as e:
+                results[index].update(status="error", error=str(e))
+                continue
+            valid[server_id] = (index, data)
+
+        if not valid:
+            return results
+
+        # also marks the written servers, the unchanged ones keep their last_updated
+        now = datetime.now(timezone.utc).isoformat()
+        operations, indexes = [], []
+        for server_id, (index, data) in valid.items():
+            unchanged = self._bulk_unchanged(data)
+            data["last_updated"] = now
+            pipeline = [{"$set": {"_bulk_before": "$$ROOT"}}] + self._upsert_pipeline(server_id, data) + [
+                {"$replaceWith": {"$cond": [unchanged, "$_bulk_before", "$$ROOT"]}},
+                {"$unset": "_bulk_before"},
+            ]
+            operations.append(UpdateOne({"server_id": server_id}, pipeline, upsert=True))
+            indexes.append(index)
+
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            upserted, modified = result.upserted_ids, result.modified_count
+        except BulkWriteError as e:
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+            modified = e.details.get("nModified", 0)
+            for error in e.details.get("writeErrors", []):
+                result = results[indexes[error["index"]]]
+                result.update(status="error", error=error.get("errmsg"))
+        for operation_index in upserted:
+            results[indexes[operation_index]]["status"] = "created"
+
+        matched = [results[index] for index in indexes if results[index]["status"] is None]
+        if 0 < modified < len(matched):
+            changed = {
+                document["server_id"]
+                for document in self.collection.find(
+                    {"server_id": {"$in": [result["server_id"] for result in matched]}, "last_updated": now},
+                    {"_id": 0, "server_id": 1},
+                )
+            }
+        else:
+            changed = {result["server_id"] for result in matched} if modified else set()
+        for result in matched:
+            result["status"] = "updated" if result["server_id"] in changed else "unchanged"
+
+        if upserted or modified:
+            self.refresh_inconsistencies({"server_id": {"$in": list(valid)}, "last_updated": now})
+        current_app.logger.info(f"Bulk upsert of {len(items)} servers, {len(upserted) + modified} written.")
+        return results
+
+    @classmethod
+    def _bulk_unchanged(cls, data: Dict) -> Dict:
+        """
+        Expression of the bulk_upsert() pipeline, true when the stored server (_bulk_before)
+        already has the values of `data`. Servers without a revision were not written by
+        the app yet and are always written.
+        """
+        stored = lambda path: {"$ifNull": [f"$_bulk_before.{path}", None]}
+        conditions = [{"$ne": [{"$type": "$_bulk_before.revision"}, "missing"]}]
+        for key, value in data.items():
+            if key not in cls._BULK_IGNORED_FIELDS:
+                conditions.append({"$eq": [stored(key), {"$literal": value}]})
+        for name, source in (data.get("sources") or {}).items():
+            conditions.append({"$eq": [stored(f"sources.{name}"), {"$literal": source}]})
+        return {"$and": conditions}
 
-    # TODO: patch or create
     def patch(self, server_id: str, server_data: Server):
         """Patch a server by ID."""
-        server = find_server_by_id(server_id)
-        if not server:
-            return DataNotFoundError("Server not found")
-        
         data = server_data.to_dict()
         data["last_updated"] = datetime.now(timezone.utc).isoformat()
-        servers_collection.update_one({"server_id": server_id}, {"$set": data})
+        result = self._write({"server_id": server_id}, [set_stage(data)])
+        if result.matched_count == 0:
+            raise DataNotFoundError("Server not found")
         return server_id
+
+    def _write(self, filter: Dict, pipeline: List[Dict], upsert: bool = False):
+        """
+        Write servers with a single update_one, which also refreshes their inconsistencies
+        when the backend can compute them inside the update.
+
+        :return: The UpdateResult, `upserted_id` tells a created server from an updated one
+        """
+        stages = self.inconsistencies.update_stages()
+        result = self.collection.update_one(filter, pipeline + (stages or []), upsert=upsert)
+        if result.matched_count == 0 and result.upserted_id is None:
+            return result
+        if stages is None:
+            self.refresh_inconsistencies({"_id": result.upserted_id} if result.upserted_id else filter)
+        else:
+            invalidate_stats()
+            invalidate_overlaps()
+        return result
     
     def delete(self, server_id: str):
         """Delete a server by ID."""
         result = self.collection.delete_one({"server_id": server_id})
         if result.deleted_count == 0:
             return None
+        invalidate_stats()
+        invalidate_overlaps()
         return server_id
     
     def create_or_update_source(self, server_id: str, source_name: str, source_data: Source):
@@ -184,75 +360,97 @@ class ServerService:
         )
 
         if update_result.modified_count == 1:
+            self.refresh_inconsistencies({"server_id": server_id})
             return jsonify({"message": f"Source '{source_name}' added successfully"}), 201
         else:
             return jsonify({"error": "Failed to add source"}), 500
 
+    def bulk_update_source(self, source_name: str, updates: List[Dict[str, Any]]) -> Dict[str, List]:
+        """Replace the `source_name` source of many servers in one bulk_write, see utils.bulk.bulk_set_source."""
+        def to_source(data: Dict[str, Any]) -> Dict[str, Any]:
+            SERVER_SOURCE_SCHEMA.check_valid(data)
+            source = load(Source.from_dict(data))
+            source.refresh_last_updated()
+            return source.to_dict()
+
+        result = bulk_set_source(self.collection, "server_id", source_name, updates, to_source)
+        if result["matched"]:
+            self.refresh_inconsistencies({"server_id": {"$in": result["matched"]}})
+        return result
+
     # add a new parameter to the function to let it return the server data even there is no inconsistency
-    def find_network_inconsistencies(self, server_id: str, return_all: bool = True):
-        # Define the JavaScript function to compute inconsistencies
-        with open("utils/networkCheck.js") as f:
-            js_function = Code(f.read())
-            
-        # Define the aggregation pipeline
-        pipeline = [
-            {
-                "$match": {
-                    "server_id": server_id
-                }
-            },
-            {
-                "$addFields": {
-                    "inconsistencies": {
-                        "$function": {
-                            "body": js_function,
-                            "args": ["$networks", "$sources"],
-                            "lang": "js"
-                        }
-                    }
-                }
-            }
+    def find_network_inconsistencies(self, server_id: str, return_all: bool = True, profile: Optional[CheckProfile] = None):
+        return self.inconsistencies.find_one({"server_id": server_id}, return_all, profile)
+
+    def get_details(self, server_id: str, profile: Optional[CheckProfile] = None) -> Dict:
+        """
+        Everything the server detail page shows in one aggregation: the server with its
+        inconsistencies, a summary of its cluster and the number of other servers in that cluster.
+        """
+        return self.inconsistencies.find_one({"server_id": server_id}, profile=profile, stages=self._detail_stages())
+
+    def get_details_version(self, server_id: str) -> Optional[Dict]:
+        """
+        Version of the detail page without building it, see composite_version(): the
+        versions of the server and of its cluster, read with one aggregation that runs no
+        check, the same as the view computes from get_details(). The number of other
+        servers in the cluster is not part of it. None when the server does not exist.
+        """
+        stages = [
+            {"$match": {"server_id": server_id}},
+            {"$limit": 1},
+            {"$project": {**VERSION_PROJECTION, "_cluster_key": CLUSTER_KEY}},
+            {"$lookup": {
+                "from": clusters_collection.name, "localField": "_cluster_key", "foreignField": "cluster_id",
+                "pipeline": [{"$project": VERSION_PROJECTION}], "as": "cluster",
+            }},
+        ]
+        versions = next(self.collection.aggregate(stages), None)
+        if versions is None:
+            return None
+        return composite_version([versions, (versions["cluster"] or [{}])[0]])
+
+    def _detail_stages(self) -> List[Dict]:
+        return [
+            {"$set": {"_cluster_key": CLUSTER_KEY}},
+            {"$lookup": {
+                "from": clusters_collection.name, "localField": "_cluster_key", "foreignField": "cluster_id",
+                "pipeline": [{"$project": CLUSTER_SUMMARY_PROJECTION}], "as": "cluster",
+            }},
+            {"$lookup": {
+                "from": self.collection.name, "localField": "_cluster_key", "foreignField": "cluster_id",
+                "pipeline": [{"$count": "count"}], "as": "cluster_servers",
+            }},
+            {"$set": {
+                "cluster": {"$first": "$cluster"},
+                "sibling_count": {"$max": [{"$subtract": [{"$ifNull": [{"$first": "$cluster_servers.count"}, 0]}, 1]}, 0]},
+            }},
+            {"$unset": ["_cluster_key", "cluster_servers"]},
         ]
-        if not return_all:
-            pipeline.append({
-                "$match": {
-                    "inconsistencies.0": {"$exists": True}  # Only include documents with inconsistencies
-                }
-            })
 
-        # Run the aggregation pipeline and return results
-        results = list(self.collection.aggregate(pipeline))
-        result = results[0] if results else {}
-        return result
+    def find_network_inconsistencies_all(self, profile: Optional[CheckProfile] = None):
+        """Servers with inconsistencies, from the materialized results unless a non-default profile is given."""
+        return self.inconsistencies.find_all(profile)
 
-    def find_network_inconsistencies_all(self):
-        # Define the JavaScript function to compute inconsistencies
-        
-        with open("utils/networkCheck.js") as f:
-            js_function = Code(f.read())
-        
-        # Define the aggregation pipeline
-        pipeline = [
-            {
-                "$addFields": {
-                    "inconsistencies": {
-                        "$function": {
-                            "body": js_function,
-                            "args": ["$networks", "$sources"],
-                            "lang": "js"
-                        }
-                    }
-                }
-            },
-            {
-                "$match": {
-                    "inconsistencies.0": {"$exists": True}  # Only include documents with inconsistencies
-                }
-            }
-        ]
+    def iter_network_inconsistencies_all(self, profile: Optional[CheckProfile] = None):
+        """Same as find_network_inconsistencies_all, streamed from the cursor with a small batch size."""
+        return self.inconsistencies.iter_all(profile, batch_size=inconsistency_stream_batch_size)
+
+    def get_version(self, server_id: str) -> Optional[Dict]:
+        """{"revision", "last_modified"} of a server, None when it does not exist."""
+        return self.collection.find_one({"server_id": server_id}, VERSION_PROJECTION)
 
-        # Run the aggregation pipeline and return results
-        return list(self.collection.aggregate(pipeline))
+    def refresh_inconsistencies(self, query: Dict):
+        """Recompute and store the inconsistencies of the servers matching the query."""
+        invalidate_stats()
+        invalidate_overlaps()
+        self.inconsistencies.refresh(query)
+
+    def rebuild_inconsistencies(self):
+        """Backfill the materialized inconsistencies of every server."""
+        invalidate_stats()
+        invalidate_overlaps()
+        self.inconsistencies.rebuild()
 
     def count(self):
         return self.collection.count_documents({})
@@ -263,71 +461,6 @@ class ServerService:
 # ------------------------------
 # Utility functions
 # ------------------------------
-def clean_data(data):
-    # Define the allowed template keys
-    template_keys = {
-        "server_id", "hostname", "serial_number", "location", "datacenter", 
-        "room", "rack", "unit", "os", "owner", "cluster", "additional_info", 
-        "networks", "sources", "last_updated"
-    }
-    
-    # Remove keys that are not in the template
-    cleaned_data = {key: value for key, value in data.items() if key in template_keys}
-    
-    # Clean networks and sources substructures recursively if they exist
-    if "networks" in cleaned_data:
-        cleaned_data["networks"] = [
-            {key: value for key, value in network.items() if key in ["name", "type", "ip", "subnet_mask", "mac"]}
-            for network in cleaned_data["networks"]
-        ]
-    
-    if "sources" in cleaned_data:
-        cleaned_data["sources"] = {
-            source: {
-                "networks": [
-                    {key: value for key, value in network.items() if key in ["name", "type", "ip", "subnet_mask", "mac"]}
-                    for network in source_data["networks"]
-                ],
-                **{key: value for key, value in source_data.items() if key != "networks"}
-            }
-            for source, source_data in cleaned_data["sources"].items()
-        }
-    
-    return cleaned_data
-
-def validate_data(data):
-    # Define the allowed template keys
-    template_keys = {
-        "server_id", "hostname", "serial_number", "location", "datacenter", 
-        "room", "rack", "unit", "os", "owner", "cluster", "additional_info", 
-        "networks", "sources", "last_updated"
-    }
-    
-    # Check if the server_id is missing
-    if "server_id" not in data:
-        return False, f"Missing required field: server_id"
-    
-    # Check if there are any extra keys not in the template
-    extra_keys = set(data.keys()) - template_keys
-    if extra_keys:
-        return False, f"Extra keys found: {extra_keys}"
-    
-    # Additional validation for networks and sources
-    if "networks" in data:
-        for network in data["networks"]:
-            if not all(key in network for key in ["name", "type", "ip", "subnet_mask", "mac"]):
-                return False, f"Missing required field in: {network}"
-    
-    if "sources" in data:
-        for source, source_data in data["sources"].items():
-            if "networks" in source_data:
-                for network in source_data["networks"]:
-                    if not all(key in network for key in ["name", "type", "ip", "subnet_mask", "mac"]):
-                        return False, f"Missing required field in: {source}"
-
-    # If all checks pass, return True
-    return True, None
-
 def find_server_by_id(server_id):
     """Finds a server by ID."""
     return servers_collection.find_one({"server_id": server_id})
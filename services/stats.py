@@ -0,0 +1,53 @@
+import time
+from threading import Lock
+from typing import Dict, Optional
+
+from utils.config import stats_ttl
+from utils.database import clusters_collection, servers_collection
+
+# Counters shared by every request of this process, dropped by invalidate_stats().
+# Other processes do not see the invalidation: with several workers the counters lag
+# writes made by another worker by up to `stats_ttl` seconds. Checking a database
+# generation (see services.overlap) would cost as much as the counters themselves.
+_cache: Dict[str, object] = {"stats": None, "expires_at": 0.0}
+_lock = Lock()
+
+def invalidate_stats():
+    """Drop the cached counters, every write to servers or clusters calls this."""
+    _cache["expires_at"] = 0.0
+
+class StatsService:
+    def get(self) -> Dict[str, int]:
+        """
+        Dashboard counters, cached for `stats_ttl` seconds.
+
+        Writes of this process are seen on the next call, writes of other processes
+        and made around the app once the cache expires.
+        """
+        if _cache["stats"] is not None and time.monotonic() < _cache["expires_at"]:
+            return dict(_cache["stats"])
+
+        with _lock:
+            # another request may have refreshed the cache while we were waiting
+            if _cache["stats"] is not None and time.monotonic() < _cache["expires_at"]:
+                return dict(_cache["stats"])
+            stats = self._compute()
+            _cache["stats"] = stats
+            _cache["expires_at"] = time.monotonic() + stats_ttl
+        return dict(stats)
+
+    def _compute(self) -> Dict[str, int]:
+        return {
+            "server_count": servers_collection.estimated_document_count(),
+            "cluster_count": clusters_collection.estimated_document_count(),
+            "server_inconsistencies_count": self._count(servers_collection, {"has_inconsistencies": True}),
+            "cluster_inconsistencies_count": self._count(clusters_collection, {"has_inconsistencies": True}),
+        }
+
+    @staticmethod
+    def _count(collection, match: Optional[Dict] = None) -> int:
+        # $match on the partial has_inconsistencies index followed by $count never fetches documents
+        pipeline = [{"$match": match}] if match else []
+        pipeline.append({"$count": "count"})
+        result = list(collection.aggregate(pipeline))
+        return result[0]["count"] if result else 0
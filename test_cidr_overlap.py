@@ -0,0 +1,36 @@
+from utils.cidr_overlap import cluster_ranges, find_overlaps, server_ranges
+
+def cluster(cluster_id, pod_cidrs, egress_cidrs=None, sources=None):
+    networks = [{"name": "pod_cidr", "type": "cidr", "cidrs": pod_cidrs}]
+    if egress_cidrs:
+        networks.append({"name": "hostsubnet", "type": "hostsubnet", "egress_cidrs": egress_cidrs})
+    return {"cluster_id": cluster_id, "networks": networks, "sources": sources or {}}
+
+def server(server_id, ip):
+    return {"server_id": server_id, "networks": [{"name": "data", "type": "ip", "ip": ip}]}
+
+def test_overlapping_pod_cidrs_between_clusters():
+    clusters = cluster_ranges([cluster("a", ["172.16.0.1/16"]), cluster("b", ["172.16.128.0/17"]), cluster("c", ["172.17.0.0/16"])])
+    overlaps = list(find_overlaps(clusters))
+    assert len(overlaps) == 1
+    assert overlaps[0]["type"] == "cluster_cluster"
+    assert overlaps[0]["overlap"] == {"first": "172.16.128.0", "last": "172.16.255.255"}
+    assert [r["entity_id"] for r in overlaps[0]["ranges"]] == ["a", "b"]
+    assert overlaps[0]["ranges"][0]["address"] == "172.16.0.0/16"
+
+def test_same_cluster_is_not_an_overlap():
+    sources = {"cilium": {"networks": [{"name": "pod_cidr", "type": "cidr", "cidrs": ["172.16.0.0/16"]}]}}
+    clusters = cluster_ranges([cluster("a", ["172.16.0.0/16", "172.16.1.0/24"], sources=sources)])
+    assert list(find_overlaps(clusters)) == []
+    assert clusters[0].claims == [{"source": None, "network": "pod_cidr"}, {"source": "cilium", "network": "pod_cidr"}]
+
+def test_egress_cidr_and_server_ip():
+    clusters = cluster_ranges([cluster("a", ["172.16.0.0/16"], egress_cidrs=["10.0.0.5/32"])])
+    servers = server_ranges([server("s1", "10.0.0.5"), server("s2", "172.16.3.4"), server("s3", "192.168.0.1"), server("s4", "bad")])
+    overlaps = list(find_overlaps(clusters, servers))
+    assert sorted((o["ranges"][0]["kind"], o["ranges"][1]["entity_id"]) for o in overlaps) == [("cidr", "s2"), ("egress", "s1")]
+    assert all(o["type"] == "cluster_server" for o in overlaps)
+
+def test_ipv4_and_ipv6_do_not_mix():
+    clusters = cluster_ranges([cluster("a", ["0.0.0.0/0"]), cluster("b", ["::/0"])])
+    assert list(find_overlaps(clusters)) == []
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from utils.inconsistency import ResultCache, get_profile, result_key
+
+INCONSISTENCIES = [{"key": "data-ip", "details": [{"field": "ip", "type": "mismatch", "values": []}]}]
+
+def test_result_key():
+    profile = get_profile()
+    version = {"_id": 1, "revision": 3, "last_modified": datetime(2026, 1, 1)}
+    assert result_key(version, profile) == (1, 3, datetime(2026, 1, 1), profile.hash)
+    assert result_key({**version, "revision": 4}, profile) != result_key(version, profile)
+    # documents without a revision are not cached
+    assert result_key({"_id": 1}, profile) is None
+
+def test_result_cache_copies():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.set(("a",), INCONSISTENCIES)
+    cache.set(("b",), [])
+    cached = cache.get(("a",))
+    assert cached == INCONSISTENCIES
+    cached.clear()
+    assert cache.get(("a",)) == INCONSISTENCIES
+    assert cache.get(("b",)) == []
+    assert cache.get(("c",)) is None and cache.get(None) is None
+
+def test_result_cache_bounded_by_size():
+    cache = ResultCache(max_bytes=3 * (ResultCache.ENTRY_OVERHEAD + 200))
+    for index in range(10):
+        cache.set((index,), INCONSISTENCIES)
+    assert 0 < cache.size <= cache.max_bytes
+    assert cache.get((9,)) == INCONSISTENCIES and cache.get((0,)) is None
+
+    disabled = ResultCache(max_bytes=0)
+    disabled.set(("a",), INCONSISTENCIES)
+    assert disabled.get(("a",)) is None
@@ -0,0 +1,67 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+import utils.json_provider as json_provider
+from models.lazy import LazyDict, LazyList
+from models.network import create_network
+from models.server import Server, Source
+from utils.json_provider import JSONProvider
+
+OBJECT_ID = ObjectId("6ad537608067389cbb840d0c")
+NETWORK = {"name": "data", "type": "ip", "ip": "10.0.0.1"}
+
+@pytest.fixture(params=["orjson", "json"])
+def app(request, monkeypatch):
+    if request.param == "json":
+        # the stdlib fallback when orjson is not installed
+        monkeypatch.setattr(json_provider, "orjson", None)
+    elif json_provider.orjson is None:
+        pytest.skip("orjson is not installed")
+    app = Flask(__name__)
+    app.json = JSONProvider(app)
+    return app
+
+def test_default_types(app):
+    server = Server(server_id="s1", hostname="h1", last_updated=datetime(2026, 1, 1, tzinfo=timezone.utc))
+    result = json.loads(app.json.dumps({
+        "id": OBJECT_ID,
+        "aware": datetime(2026, 1, 1, 12, tzinfo=timezone(timedelta(hours=8))),
+        # pymongo returns naive UTC datetimes
+        "naive": datetime(2026, 1, 1, 12, 30, 15, 123000),
+        "day": date(2026, 1, 2),
+        "server": server,
+    }))
+    assert result == {
+        "id": "6ad537608067389cbb840d0c",
+        "aware": "2026-01-01T12:00:00+08:00",
+        "naive": "2026-01-01T12:30:15.123000+00:00",
+        "day": "2026-01-02",
+        "server": {"server_id": "s1", "hostname": "h1", "last_updated": "2026-01-01T00:00:00+00:00"},
+    }
+
+def test_lazy_containers(app):
+    networks = LazyList([NETWORK], create_network)
+    sources = LazyDict({"cmdb": {"hostname": "h1"}}, Source.from_dict)
+    # the stored items as they are until an item is read
+    assert json.loads(app.json.dumps([networks, sources])) == [[NETWORK], {"cmdb": {"hostname": "h1"}}]
+    networks[0].mac = "aa:bb"
+    assert json.loads(app.json.dumps(networks)) == [{**NETWORK, "subnet_mask": None, "mac": "aa:bb"}]
+
+def test_options(app):
+    assert app.json.dumps({"b": 1, "a": 2}).replace(" ", "") == '{"a":2,"b":1}'
+    assert app.json.dumps({"b": 1, "a": 2}, sort_keys=False).replace(" ", "") == '{"b":1,"a":2}'
+    # orjson only takes str keys and 64 bit integers, those calls go to the stdlib
+    assert json.loads(app.json.dumps({2: OBJECT_ID, 1: "a"})) == {"1": "a", "2": "6ad537608067389cbb840d0c"}
+    assert app.json.dumps(2 ** 70) == str(2 ** 70)
+    with pytest.raises(TypeError):
+        app.json.dumps(object())
+
+def test_response(app):
+    with app.app_context():
+        response = app.json.response({"id": OBJECT_ID})
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_data()) == {"id": "6ad537608067389cbb840d0c"}
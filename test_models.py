@@ -0,0 +1,61 @@
+import pytest
+
+from models.cluster import Cluster
+from models.lazy import load
+from models.network import IPNetwork
+from models.server import Server
+
+SERVER = {
+    "server_id": "sn-1",
+    "hostname": "TW-DC1-R1-A01-1",
+    "cluster_id": "envconfig_c1",
+    "env_config": "envconfig_c1",
+    "networks": [{"name": "data", "type": "ip", "ip": "10.0.0.1", "subnet_mask": "255.255.255.0", "mac": None}],
+    "sources": {"Inventory": {"hostname": "TW-DC1-R1-A01-1", "networks": [{"name": "data", "type": "ip", "ip": "10.0.0.1"}]}},
+}
+
+def test_server_round_trip():
+    server = load(Server.from_dict(SERVER))
+    assert isinstance(server.networks[0], IPNetwork)
+    # network fields are kept when None, the other models drop them
+    assert server.to_dict() == {
+        **SERVER,
+        "sources": {"Inventory": {
+            "hostname": "TW-DC1-R1-A01-1",
+            "networks": [{"name": "data", "type": "ip", "ip": "10.0.0.1", "subnet_mask": None, "mac": None}],
+        }},
+    }
+
+def test_lazy_sources():
+    server = Server.from_dict(SERVER)
+    # nothing read, the stored networks and sources are written back as they are
+    data = server.to_dict()
+    assert data["networks"] is SERVER["networks"] and data["sources"] is SERVER["sources"]
+
+    server.sources["Inventory"].hostname = "renamed"
+    data = server.to_dict()
+    assert data["sources"]["Inventory"]["hostname"] == "renamed"
+    assert data["sources"]["Inventory"]["networks"] is SERVER["sources"]["Inventory"]["networks"]
+    assert data["networks"] is SERVER["networks"]
+
+    server.add_network(IPNetwork(name="admin", type="ip"))
+    assert [network.name for network in server.networks] == ["data", "admin"]
+    assert len(server.to_dict()["networks"]) == 2 and len(SERVER["networks"]) == 1
+
+def test_models_are_slotted():
+    server = Server.from_dict(SERVER)
+    for obj in (server, server.networks[0], server.sources["Inventory"]):
+        assert not hasattr(obj, "__dict__")
+
+def test_cluster_defaults():
+    cluster = Cluster.from_dict({"env_config": "c1", "last_updated": "2024-12-19T19:30:00+00:00", "networks": []})
+    assert cluster.to_dict() == {
+        "cluster_id": "c1", "env_config": "c1", "additional_info": {}, "last_updated": "2024-12-19T19:30:00+00:00",
+    }
+
+def test_invalid_documents():
+    with pytest.raises(ValueError):
+        Server.from_dict({"hostname": "no id"})
+    # networks are decoded on first access, or all at once by load()
+    with pytest.raises(ValueError):
+        load(Server.from_dict({"server_id": "sn-1", "networks": [{"name": "data"}]}))
@@ -0,0 +1,53 @@
+import pytest
+
+from utils.network_check import NetworkChecker, check
+
+def ip(name, ip=None, **kwargs):
+    return {"name": name, "type": "ip", "ip": ip, **kwargs}
+
+def test_consistent_sources_case_insensitive():
+    networks = [ip("data", "10.0.0.1", mac="AA:BB:CC:DD:EE:FF")]
+    sources = {"Inventory": {"networks": [ip("data", "10.0.0.1", mac="aa:bb:cc:dd:ee:ff")]}}
+    assert check(networks, sources) == []
+
+def test_ip_mismatch():
+    networks = [ip("data", "10.0.0.1")]
+    sources = {"Inventory": {"networks": [ip("data", "10.0.0.2")]}}
+    result = check(networks, sources)
+    assert len(result) == 1
+    assert result[0]["key"] == "data-ip"
+    assert result[0]["sources"] == ["Inventory", "Truth"]
+    detail = result[0]["details"][0]
+    assert detail["type"] == "mismatch"
+    assert detail["values"] == [
+        {"value": "10.0.0.2", "sources": ["Inventory"]},
+        {"value": "10.0.0.1", "sources": ["Truth"]},
+    ]
+
+def test_missing_ip_and_admin_allowed():
+    networks = [ip("data", "10.0.0.1"), ip("admin", "11.0.0.1")]
+    sources = {"Inventory": {"networks": [{"name": "data", "type": "ip"}, {"name": "admin", "type": "ip"}]}}
+    result = check(networks, sources)
+    assert [r["key"] for r in result] == ["data-ip"]
+    assert result[0]["details"][0]["missingSources"] == ["Inventory"]
+
+def test_cidrs_compared_as_multiset():
+    networks = [{"name": "pod", "type": "cidr", "cidrs": ["10.0.0.0/24", "10.0.1.0/24"]}]
+    sources = {"Cilium": {"networks": [{"name": "pod", "type": "cidr", "cidrs": ["10.0.1.0/24", "10.0.0.0/24"]}]}}
+    assert check(networks, sources) == []
+    sources["Cilium"]["networks"][0]["cidrs"] = ["10.0.1.0/24", "10.0.1.0/24"]
+    assert check(networks, sources)[0]["details"][0]["type"] == "mismatch"
+
+def test_types_filter_skips_other_networks():
+    checker = NetworkChecker(types=["cidr"])
+    networks = [ip("data", "10.0.0.1")]
+    sources = {"Inventory": {"networks": [ip("data", "10.0.0.2")]}}
+    assert checker.check(networks, sources) == []
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        NetworkChecker(types="ip")
+    with pytest.raises(ValueError):
+        NetworkChecker(types=["vlan"])
+    with pytest.raises(ValueError):
+        check([], {"Truth": {"networks": []}})
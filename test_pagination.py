@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from utils.pagination import decode_cursor, encode_cursor, keyset_match
+
+def test_cursor_round_trip():
+    _id = ObjectId()
+    cursor = encode_cursor({"_id": _id, "last_modified": datetime(2026, 1, 1, 12, 30)}, "last_modified", -1)
+    assert decode_cursor(cursor, "last_modified", -1) == {
+        "field": "last_modified", "id": _id, "value": datetime(2026, 1, 1, 12, 30), "direction": -1,
+    }
+    assert decode_cursor(encode_cursor({"_id": _id})) == {"field": "_id", "id": _id, "value": None}
+    # a missing sort field is a null value
+    assert decode_cursor(encode_cursor({"_id": _id}, "rack"), "rack")["value"] is None
+
+def test_invalid_cursor():
+    cursor = encode_cursor({"_id": ObjectId(), "rack": "R1"}, "rack")
+    for field, direction in (("_id", 1), ("rack", -1)):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, field, direction)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+def test_keyset_match_null():
+    cursor = {"id": 1, "value": None}
+    same_value = {"rack": None, "_id": {"$gt": 1}}
+    assert keyset_match(cursor, "rack") == {"$or": [{"rack": {"$ne": None}}, same_value]}
+    assert keyset_match(cursor, "rack", -1) == {"rack": None, "_id": {"$lt": 1}}
+    assert keyset_match({"id": 1}, "_id", -1) == {"_id": {"$lt": 1}}
+
+def test_keyset_match_mixed_types():
+    # numbers sort after null and before strings, dates and the other types
+    ascending = keyset_match({"id": 1, "value": 12}, "rack")["$or"]
+    assert ascending[:2] == [{"rack": {"$gt": 12}}, {"rack": 12, "_id": {"$gt": 1}}]
+    assert ascending[2]["rack"]["$type"][:2] == ["string", "object"]
+    assert "date" in ascending[2]["rack"]["$type"] and "number" not in ascending[2]["rack"]["$type"]
+
+    descending = keyset_match({"id": 1, "value": "R12"}, "rack", -1)["$or"]
+    assert descending == [
+        {"rack": {"$lt": "R12"}}, {"rack": "R12", "_id": {"$lt": 1}}, {"rack": None}, {"rack": {"$type": ["number"]}},
+    ]
+    # True is a bool, not the number 1
+    assert "number" in keyset_match({"id": 1, "value": True}, "rack", -1)["$or"][3]["rack"]["$type"]
+
+    # dates sort after strings
+    value = datetime(2026, 1, 1)
+    assert keyset_match({"id": 1, "value": value}, "last_modified", -1)["$or"][3] == {
+        "last_modified": {"$type": ["number", "string", "object", "array", "binData", "objectId", "bool"]},
+    }
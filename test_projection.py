@@ -0,0 +1,26 @@
+import pytest
+
+from utils.projection import parse_projection
+
+def test_parse_projection():
+    assert parse_projection() is None
+    assert parse_projection("hostname, sources.cmdb,hostname") == {"hostname": 1, "sources.cmdb": 1, "_id": 0}
+    assert parse_projection("_id,hostname") == {"_id": 1, "hostname": 1}
+    assert parse_projection(exclude="sources") == {"sources": 0, "_id": 0}
+    # siblings sharing a prefix are not parents of each other
+    assert parse_projection("sources.cmdb,sources.cmdb2,sources-x") == {
+        "sources.cmdb": 1, "sources.cmdb2": 1, "sources-x": 1, "_id": 0,
+    }
+
+@pytest.mark.parametrize("fields,exclude", [
+    ("sources,sources.cmdb", None),
+    ("sources.cmdb.networks,sources", None),
+    (None, "sources.cmdb,sources"),
+    ("_id,_id.x", None),
+    ("hostname", "sources"),
+    ("$where", None),
+    (" , ", None),
+])
+def test_invalid_projection(fields, exclude):
+    with pytest.raises(ValueError):
+        parse_projection(fields, exclude)
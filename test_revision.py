@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from utils.revision import representation_version, split_version, version_etag, with_version
+
+def test_with_version():
+    projection, hidden = with_version({"_id": 0, "hostname": 1, "revision": 1})
+    assert projection == {"_id": 0, "hostname": 1, "revision": 1, "last_modified": 1}
+    assert hidden == ["last_modified"]
+
+    document = {"hostname": "h1", "revision": 3, "last_modified": datetime(2026, 1, 1)}
+    assert split_version(document, hidden) == {"revision": 3, "last_modified": datetime(2026, 1, 1)}
+    assert document == {"hostname": "h1", "revision": 3}
+
+    # an exclusion projection returns the version unless it is excluded
+    assert with_version({"_id": 0, "networks": 0, "revision": 0}) == ({"_id": 0, "networks": 0}, ["revision"])
+
+def test_representation_version():
+    version = {"revision": 3, "last_modified": datetime(2026, 1, 1)}
+    assert representation_version(version, None) is version
+    hostname = version_etag(representation_version(version, {"hostname": 1, "_id": 0}))
+    assert hostname != version_etag(version)
+    assert hostname == version_etag(representation_version(version, {"_id": 0, "hostname": 1}))
+    assert hostname != version_etag(representation_version(version, {"hostname": 0, "_id": 0}))
@@ -0,0 +1,52 @@
+import pytest
+
+from utils.validation import CLUSTER_SCHEMA, SERVER_SCHEMA, SERVER_SOURCE_SCHEMA, ValidationError
+
+SERVER = {
+    "server_id": "sn-1",
+    "hostname": "TW-DC1-R1-A01-1",
+    "unit": 3,
+    "networks": [{"name": "data", "type": "ip", "ip": "10.0.0.1", "subnet_mask": "255.255.255.0", "mac": None}],
+    "sources": {"Inventory": {"networks": [{"name": "pods", "type": "cidr", "cidrs": ["10.1.0.0/16"]}]}},
+    "last_updated": "2024-12-19T19:30:00+00:00",
+    # returned by the read APIs, accepted when sent back
+    "revision": 3,
+}
+
+def test_valid_documents():
+    assert SERVER_SCHEMA.validate(SERVER) == []
+    assert CLUSTER_SCHEMA.validate({"env_config": "c1", "owners": ["user1"], "networks": []}) == []
+    # NaN is how pandas reads an empty spreadsheet cell
+    assert SERVER_SCHEMA.validate({"server_id": "sn-1", "as_number": float("nan")}) == []
+
+def test_error_paths():
+    errors = SERVER_SCHEMA.validate({
+        **SERVER,
+        "server_id": "",
+        "as_number": "AS64600",
+        "extra": 1,
+        "networks": [{"name": "data", "type": "vlan"}, {"type": "ip", "ip": ["10.0.0.1"]}],
+        "sources": {"Inventory": {"networks": [{"name": "pods", "type": "cidr", "cidrs": "10.1.0.0/16"}]}, "a.b": {}},
+    })
+    assert errors == [
+        {"path": "server_id", "error": "is required"},
+        {"path": "networks[0].type", "error": "must be one of ip, cidr, hostsubnet"},
+        {"path": "networks[1].name", "error": "is required"},
+        {"path": "networks[1].ip", "error": "must be a string"},
+        {"path": "sources.Inventory.networks[0].cidrs", "error": "must be a list"},
+        {"path": "sources.a.b", "error": "invalid name"},
+        {"path": "as_number", "error": "must be an integer"},
+        {"path": "extra", "error": "unknown field"},
+    ]
+    assert CLUSTER_SCHEMA.validate({"cluster_name": "c1"}) == [
+        {"path": "$", "error": "one of cluster_id, env_config is required"},
+    ]
+
+def test_batches():
+    assert SERVER_SCHEMA.validate_batch([SERVER, {"hostname": "no id"}, SERVER, "x"]) == {
+        1: [{"path": "server_id", "error": "is required"}],
+        3: [{"path": "$", "error": "must be an object"}],
+    }
+    with pytest.raises(ValidationError) as e:
+        SERVER_SOURCE_SCHEMA.check_valid({"networks": {}})
+    assert e.value.errors == [{"path": "networks", "error": "must be a list"}]
@@ -0,0 +1,58 @@
+from typing import Any, Callable, Dict, List
+
+from pymongo import UpdateOne
+
+from utils.validation import ValidationError
+
+def bulk_set_source(collection, id_field: str, source_name: str, updates: List[Dict[str, Any]],
+                    to_source: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, List]:
+    """
+    Replace one source on many documents with a single unordered bulk_write.
+
+    Each update is {id_field: ..., **source data}. The source is written with
+    $set: {"sources.<name>": ...}, so the other sources are never read or rewritten.
+    An id given twice is invalid after its first update. Nothing is read before the
+    write: only when its matched_count falls short of the updates are the ids read
+    back with $in to tell the matched ids from the missing ones.
+
+    :param to_source: Validates the source data and returns the document to store
+    :return: {"matched": [ids], "missing": [ids], "invalid": [{"index", "error"[, "errors"]}]}
+    """
+    if not source_name or source_name.startswith("$") or "." in source_name:
+        raise ValueError(f"Invalid source name: {source_name}")
+
+    sources, indexes, invalid = {}, {}, []
+    for index, update in enumerate(updates):
+        try:
+            if not isinstance(update, dict) or not update.get(id_field):
+                raise ValueError(f"{id_field} is required")
+            document_id = str(update[id_field])
+            if document_id in indexes:
+                raise ValueError(f"duplicate {id_field}, first given at index {indexes[document_id]}")
+            indexes[document_id] = index
+            data = {key: value for key, value in update.items() if key != id_field}
+            sources[document_id] = to_source(data)
+        except ValidationError as e:
+            invalid.append({"index": index, "error": str(e), "errors": e.errors})
+        except Exception as e:
+            invalid.append({"index": index, "error": str(e)})
+
+    if not sources:
+        return {"matched": [], "missing": [], "invalid": invalid}
+
+    operations = [
+        UpdateOne({id_field: document_id}, {"$set": {f"sources.{source_name}": source}})
+        for document_id, source in sources.items()
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    if result.matched_count == len(operations):
+        return {"matched": list(sources), "missing": [], "invalid": invalid}
+
+    # upsert=False, the missing ids were not written
+    existing = {
+        document[id_field]
+        for document in collection.find({id_field: {"$in": list(sources)}}, {"_id": 0, id_field: 1})
+    }
+    matched = [document_id for document_id in sources if document_id in existing]
+    missing = [document_id for document_id in sources if document_id not in existing]
+    return {"matched": matched, "missing": missing, "invalid": invalid}
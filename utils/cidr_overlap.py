@@ -0,0 +1,106 @@
+import heapq
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# =============================================================================
+# Address ranges
+# =============================================================================
+@dataclass
+class AddressRange:
+    """One CIDR or IP of one server or cluster as an integer [start, end] range."""
+    entity: str
+    entity_id: str
+    kind: str
+    address: str
+    version: int
+    start: int
+    end: int
+    claims: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "entity": self.entity,
+            "entity_id": self.entity_id,
+            "kind": self.kind,
+            "address": self.address,
+            "claims": self.claims,
+        }
+
+def parse_range(value: Any) -> Optional[Tuple[int, int, int, str]]:
+    """(version, start, end, normalized network) of a CIDR or IP, None when it cannot be parsed."""
+    try:
+        network = ipaddress.ip_network(str(value).strip(), strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.network_address), int(network.broadcast_address), str(network)
+
+def _networks_by_source(document: Dict) -> Iterator[Tuple[Optional[str], List[Dict]]]:
+    # the merged networks are reported with source None
+    yield None, document.get("networks") or []
+    for source_name, source in (document.get("sources") or {}).items():
+        yield source_name, (source or {}).get("networks") or []
+
+def _collect(documents: Iterable[Dict], entity: str, id_field: str, values_by_type: Dict[str, Tuple[str, str]]) -> List[AddressRange]:
+    # one range per (entity, kind, address), every source that reports it is a claim
+    ranges: Dict[Tuple, AddressRange] = {}
+    for document in documents:
+        entity_id = document.get(id_field)
+        for source_name, networks in _networks_by_source(document):
+            for network in networks:
+                if not isinstance(network, dict) or network.get("type") not in values_by_type:
+                    continue
+                field_name, kind = values_by_type[network["type"]]
+                values = network.get(field_name)
+                for value in values if isinstance(values, list) else [values]:
+                    parsed = parse_range(value) if value else None
+                    if parsed is None:
+                        continue
+                    version, start, end, address = parsed
+                    key = (entity_id, kind, version, start, end)
+                    if key not in ranges:
+                        ranges[key] = AddressRange(entity, entity_id, kind, address, version, start, end)
+                    ranges[key].claims.append({"source": source_name, "network": network.get("name")})
+    return list(ranges.values())
+
+def cluster_ranges(clusters: Iterable[Dict]) -> List[AddressRange]:
+    """Pod/service CIDRs (`cidr` networks) and egress CIDRs (`hostsubnet` networks) of every cluster."""
+    return _collect(clusters, "cluster", "cluster_id", {"cidr": ("cidrs", "cidr"), "hostsubnet": ("egress_cidrs", "egress")})
+
+def server_ranges(servers: Iterable[Dict]) -> List[AddressRange]:
+    """The IP of every `ip` network of every server as a single address range."""
+    return _collect(servers, "server", "server_id", {"ip": ("ip", "ip")})
+
+# =============================================================================
+# Interval sweep
+# =============================================================================
+def _address(version: int, value: int) -> str:
+    return str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+
+def find_overlaps(clusters: List[AddressRange], servers: Optional[List[AddressRange]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Overlaps between the ranges of different clusters, and between cluster ranges and server IPs.
+
+    The ranges are sorted once by start, then swept with a min-heap of the cluster ranges
+    still open at the current start, so the cost is O(n log n) plus the overlaps reported.
+    """
+    # at the same start the widest range comes first, so a range contains every later one
+    ordered = sorted(clusters + (servers or []), key=lambda item: (item.version, item.start, -item.end))
+    active = []
+    for index, current in enumerate(ordered):
+        while active and (active[0][0], active[0][1]) < (current.version, current.start):
+            heapq.heappop(active)
+        for _, _, _, other in active:
+            if (other.entity, other.entity_id) == (current.entity, current.entity_id):
+                continue
+            yield {
+                "type": "cluster_server" if current.entity == "server" else "cluster_cluster",
+                "overlap": {
+                    "first": _address(current.version, current.start),
+                    "last": _address(current.version, min(current.end, other.end)),
+                },
+                "ranges": [other.to_dict(), current.to_dict()],
+            }
+        # server IPs never contain anything, only cluster ranges stay open
+        if current.entity == "cluster":
+            heapq.heappush(active, (current.version, current.end, index, current))
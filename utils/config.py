@@ -1,4 +1,5 @@
 from configparser import ConfigParser
+import json
 import os
 
 # =============================================================================
@@ -17,8 +18,41 @@ mongo_servers_collection = config.get('database', 'servers_collection', fallback
 mongo_clusters_collection = config.get('database', 'clusters_collection', fallback="clusters")
 mongo_cilium_collection = config.get('database', 'cilium_collection', fallback="cilium")
 
+# MongoClient shared by each process
+mongo_app_name = os.environ.get("MONGO_APP_NAME", config.get('database', 'app_name', fallback="ip-management"))
+mongo_max_pool_size = int(os.environ.get("MONGO_MAX_POOL_SIZE", config.get('database', 'max_pool_size', fallback="100")))
+mongo_min_pool_size = int(os.environ.get("MONGO_MIN_POOL_SIZE", config.get('database', 'min_pool_size', fallback="0")))
+mongo_server_selection_timeout_ms = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", config.get('database', 'server_selection_timeout_ms', fallback="30000")))
+mongo_connect_timeout_ms = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", config.get('database', 'connect_timeout_ms', fallback="20000")))
+mongo_socket_timeout_ms = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", config.get('database', 'socket_timeout_ms', fallback="0")))
+mongo_ensure_indexes = os.environ.get("MONGO_ENSURE_INDEXES", config.get('database', 'ensure_indexes', fallback="true")).lower() == "true"
+
 
 _flask_port_str = os.environ.get("FLASK_PORT", config.get('flask', 'port', fallback = None))
 flask_port = int(_flask_port_str) if _flask_port_str else None
 flask_admin_user = os.environ.get("FLASK_ADMIN_USER", config.get('flask', 'admin_user', fallback = None))
 flask_admin_password = os.environ.get("FLASK_ADMIN_PASSWORD", config.get('flask', 'admin_password', fallback = None))
+
+# Inconsistency engine
+inconsistency_backend = os.environ.get("INCONSISTENCY_BACKEND", config.get('inconsistency', 'backend', fallback="js")).lower()
+inconsistency_batch_size = int(os.environ.get("INCONSISTENCY_BATCH_SIZE", config.get('inconsistency', 'batch_size', fallback="1000")))
+inconsistency_stream_batch_size = int(os.environ.get("INCONSISTENCY_STREAM_BATCH_SIZE", config.get('inconsistency', 'stream_batch_size', fallback="100")))
+inconsistency_cache_bytes = int(float(os.environ.get("INCONSISTENCY_CACHE_MB", config.get('inconsistency', 'cache_mb', fallback="64"))) * 1024 * 1024)
+
+# Inconsistency check profiles, one [profile:<name>] section each with JSON values
+check_profiles = {
+    section.split(':', 1)[1]: {key: json.loads(value) for key, value in config.items(section)}
+    for section in config.sections() if section.startswith('profile:')
+}
+
+# Bulk APIs, largest number of items accepted in one request
+bulk_max_items = int(os.environ.get("BULK_MAX_ITEMS", config.get('bulk', 'max_items', fallback="50000")))
+
+# Server table search, the filtered count stops at count_limit
+search_count_limit = int(os.environ.get("SEARCH_COUNT_LIMIT", config.get('search', 'count_limit', fallback="10000")))
+
+# CIDR overlap report
+overlap_ttl = float(os.environ.get("OVERLAP_TTL", config.get('overlap', 'ttl', fallback="300")))
+
+# Dashboard counters
+stats_ttl = float(os.environ.get("STATS_TTL", config.get('stats', 'ttl', fallback="10")))
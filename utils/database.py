@@ -1,50 +1,81 @@
 import os
+from threading import Lock
 import pymongo
 from utils.config import mongo_uri, mongo_database, mongo_userame, mongo_password, mongo_servers_collection, mongo_clusters_collection, mongo_cilium_collection
+from utils.config import mongo_app_name, mongo_max_pool_size, mongo_min_pool_size, mongo_server_selection_timeout_ms, mongo_connect_timeout_ms, mongo_socket_timeout_ms
+
+# =============================================================================
+# Shared MongoClient
+# =============================================================================
+# One client per process, created on first use. A client must not be shared
+# across fork (e.g. gunicorn pre-fork workers), so the child drops the one it
+# inherited and creates its own.
+_client = None
+_client_lock = Lock()
+
+def _reset_after_fork():
+    global _client, _client_lock
+    _client = None
+    _client_lock = Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_client() -> pymongo.MongoClient:
+    """Return the MongoClient of this process, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = {
+                    "appname": mongo_app_name,
+                    "maxPoolSize": mongo_max_pool_size,
+                    "minPoolSize": mongo_min_pool_size,
+                    "serverSelectionTimeoutMS": mongo_server_selection_timeout_ms,
+                    "connectTimeoutMS": mongo_connect_timeout_ms,
+                    "socketTimeoutMS": mongo_socket_timeout_ms,
+                }
+                if mongo_userame and mongo_password:
+                    # Authenticate with username and password
+                    options.update(username=mongo_userame, password=mongo_password)
+                _client = pymongo.MongoClient(mongo_uri, **options)
+    return _client
+
+def get_database():
+    return get_client()[mongo_database]
+
+def get_collection(name: str):
+    return get_database()[name]
 
 # =============================================================================
 # Connect to MongoDB
 # =============================================================================
 def connect_to_database(target_collection=''):
     """
-    Connect to MongoDB and return the specified collection or database.
+    Return the specified collection or database on the shared client.
 
     :param target_collection: Name of the collection to connect to (optional)
     :return: A MongoDB collection or database object
     """
-    try:
-        if mongo_userame and mongo_password:
-            # Authenticate with username and password
-            mongo_client = pymongo.MongoClient(mongo_uri, username=mongo_userame, password=mongo_password)
-        else:
-            # Connect without authentication
-            mongo_client = pymongo.MongoClient(mongo_uri)
-    except Exception as error:
-        print(f"[Error] Failed to connect to MongoDB: {error}")
-        return None
-
-    print("[Success] Connected to MongoDB successfully")
-
-    # Select database
-    database = mongo_client[mongo_database]
-
     if not target_collection:
-        return database
+        return get_database()
+    return get_collection(target_collection)
+
+class LazyCollection:
+    """
+    Stands in for a collection until it is used, then forwards to the collection
+    on the client of the current process. Importing this module opens no connection.
+    """
 
-    # Select collection
-    collection = database[target_collection]
+    def __init__(self, name: str):
+        self.name = name
 
-    # Check if collection exists
-    existing_collections = database.list_collection_names()
-    if target_collection in existing_collections:
-        print(f"[Info] Collection '{target_collection}' already exists.")
-    else:
-        print(f"[Info] Collection '{target_collection}' does not exist. It will be created when data is added.")
+    def __getattr__(self, attribute):
+        return getattr(get_collection(self.name), attribute)
 
-    return collection
+    def __repr__(self) -> str:
+        return f"LazyCollection({self.name!r})"
 
-# Establish connection to database and collections
-db = connect_to_database()
-servers_collection = db[mongo_servers_collection] if db is not None else None
-clusters_collection = db[mongo_clusters_collection] if db is not None else None
-cilium_collection = db[mongo_cilium_collection] if db is not None else None
+servers_collection = LazyCollection(mongo_servers_collection)
+clusters_collection = LazyCollection(mongo_clusters_collection)
+cilium_collection = LazyCollection(mongo_cilium_collection)
@@ -0,0 +1,384 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import bson
+from bson import Code
+from pymongo import UpdateOne
+
+from utils.config import check_profiles, inconsistency_backend, inconsistency_batch_size, inconsistency_cache_bytes
+from utils.network_check import NetworkChecker, inconsistency_fields
+from utils.revision import REVISION_STAGE, REVISION_UPDATE
+
+NETWORK_CHECK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "networkCheck.js")
+
+# =============================================================================
+# networkCheck.js loader
+# =============================================================================
+class NetworkCheckScript:
+    """
+    networkCheck.js loaded once per process.
+
+    The file is only read again when its mtime changes, and the pipeline stages
+    that embed the script are rebuilt at the same time.
+    """
+
+    def __init__(self, path: str = NETWORK_CHECK_SCRIPT):
+        self.path = path
+        self._mtime = None
+        self._stages = None
+        self._lock = Lock()
+
+    def stages(self) -> Dict[str, Any]:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path) as f:
+                        self._stages = self._build_stages(Code(f.read()))
+                    self._mtime = mtime
+        return self._stages
+
+    @staticmethod
+    def _build_stages(js_function: Code) -> Dict[str, Any]:
+        function = {
+            "$function": {
+                "body": js_function,
+                "args": ["$networks", {"$ifNull": ["$sources", {}]}],
+                "lang": "js"
+            }
+        }
+        return {
+            "add_fields": {"$addFields": {"inconsistencies": function}},
+            # Only include documents with inconsistencies
+            "only_inconsistent": {"$match": {"inconsistencies.0": {"$exists": True}}},
+            "update": [
+                {"$set": {"inconsistencies": function}},
+                {"$set": {"inconsistency_count": {"$size": "$inconsistencies"}}},
+                {"$set": {"has_inconsistencies": {"$gt": ["$inconsistency_count", 0]}}},
+            ],
+        }
+
+network_check_script = NetworkCheckScript()
+
+# =============================================================================
+# Check profiles
+# =============================================================================
+# Positional order of the options after (networks, sources) in check() of networkCheck.js
+JS_OPTION_ORDER = (
+    ("types", ["ip", "cidr", "hostsubnet"]),
+    ("allow_missing_fields", {}),
+    ("fields_to_check", {}),
+    ("allow_null_fields", {}),
+    ("allow_missing_names", {}),
+    ("allow_null_names", {}),
+)
+
+class CheckProfile:
+    """A named set of check() options with its compiled Python checker."""
+
+    def __init__(self, name: str, options: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.options = options or {}
+        self.checker = NetworkChecker(**self.options)
+        self.hash = hashlib.sha1(json.dumps(self.options, sort_keys=True).encode()).hexdigest()[:16]
+        self.is_default = not self.options
+
+    def add_fields_stage(self) -> Dict[str, Any]:
+        if self.is_default:
+            return network_check_script.stages()["add_fields"]
+        js_options = [{"$literal": self.options.get(key, default)} for key, default in JS_OPTION_ORDER]
+        stage = network_check_script.stages()["add_fields"]["$addFields"]["inconsistencies"]["$function"]
+        function = {**stage, "args": stage["args"] + js_options}
+        return {"$addFields": {"inconsistencies": {"$function": function}}}
+
+DEFAULT_PROFILE = "default"
+
+profiles: Dict[str, CheckProfile] = {DEFAULT_PROFILE: CheckProfile(DEFAULT_PROFILE)}
+profiles.update({name: CheckProfile(name, options) for name, options in check_profiles.items()})
+
+def get_profile(name: Optional[str] = None) -> CheckProfile:
+    """Look up a check profile by name, the default profile when no name is given."""
+    if not name:
+        return profiles[DEFAULT_PROFILE]
+    if name not in profiles:
+        raise ValueError(f"Unknown check profile: {name}")
+    return profiles[name]
+
+# =============================================================================
+# Result cache
+# =============================================================================
+# Only the fields a key is built from, read before running the check in mongod
+RESULT_KEY_PROJECTION = {"_id": 1, "revision": 1, "last_modified": 1}
+
+def result_key(document: Dict, profile: CheckProfile) -> Optional[tuple]:
+    """
+    Cache key of the inconsistencies of a document version for a profile.
+
+    Every write bumps the stored revision (see utils.revision), so it identifies the
+    networks and sources the check reads without hashing them. Documents never written
+    since revisions were introduced have none and are not cached.
+    """
+    revision = document.get("revision")
+    if revision is None:
+        return None
+    return (document.get("_id"), revision, document.get("last_modified"), profile.hash)
+
+class ResultCache:
+    """
+    LRU cache of inconsistencies keyed on result_key(), bounded by memory.
+
+    Results are kept BSON encoded, which makes their size exact and hands every
+    caller its own copy.
+    """
+
+    # the key tuple and the OrderedDict entry of a result
+    ENTRY_OVERHEAD = 200
+    EMPTY = b""
+
+    def __init__(self, max_bytes: int = inconsistency_cache_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key) -> Optional[List[Dict]]:
+        if key is None:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return None
+            self._data.move_to_end(key)
+        # most documents have no inconsistencies, their empty list is not encoded
+        return bson.decode(value)["r"] if value else []
+
+    def set(self, key, inconsistencies: List[Dict]):
+        if key is None or not self.enabled:
+            return
+        value = bson.encode({"r": inconsistencies}) if inconsistencies else self.EMPTY
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous) + self.ENTRY_OVERHEAD
+            self._data[key] = value
+            self.size += len(value) + self.ENTRY_OVERHEAD
+            while self.size > self.max_bytes and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted) + self.ENTRY_OVERHEAD
+
+result_cache = ResultCache()
+
+def check_documents(documents: Iterable[Dict], profile: CheckProfile, return_all: bool = True) -> Iterator[Dict]:
+    """Attach `inconsistencies` to a stream of documents, reusing cached results."""
+    check = profile.checker.check
+    for document in documents:
+        key = result_key(document, profile)
+        inconsistencies = result_cache.get(key)
+        if inconsistencies is None:
+            inconsistencies = check(document.get("networks"), document.get("sources"))
+            result_cache.set(key, inconsistencies)
+        if inconsistencies or return_all:
+            document["inconsistencies"] = inconsistencies
+            yield document
+
+def _batches(iterable: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# =============================================================================
+# Inconsistency pipeline shared by servers and clusters
+# =============================================================================
+def set_stage(data: Dict) -> Dict:
+    """Update pipeline stage setting the fields of `data` as they are, like {"$set": data} in an update document."""
+    return {"$set": {key: {"$literal": value} for key, value in data.items()}}
+
+class InconsistencyPipeline:
+    """Compute, store and query the network inconsistencies of one collection."""
+
+    def __init__(self, collection, backend: Optional[str] = None):
+        self.collection = collection
+        self.backend = backend or inconsistency_backend
+        if self.backend not in ("js", "python"):
+            raise ValueError(f"Unknown inconsistency backend: {self.backend}")
+
+    def iter_find(self, match: Dict, return_all: bool = True, profile: Optional[CheckProfile] = None,
+                  batch_size: int = inconsistency_batch_size, stages: Optional[List[Dict]] = None) -> Iterator[Dict]:
+        """
+        Stream the documents matching `match` with `inconsistencies` computed for the given profile.
+
+        Results are cached per document revision and profile on both backends, see ResultCache.
+
+        :param stages: Extra pipeline stages, e.g. $lookup, run in the same aggregation after the check
+        """
+        profile = profile or get_profile()
+        if self.backend == "python":
+            if stages:
+                cursor = self.collection.aggregate([{"$match": match}] + stages, batchSize=batch_size)
+            else:
+                cursor = self.collection.find(match, batch_size=batch_size)
+            return check_documents(cursor, profile, return_all)
+
+        if result_cache.enabled:
+            return self._iter_find_cached(match, return_all, profile, batch_size, stages or [])
+        pipeline = [{"$match": match}] if match else []
+        pipeline.append(profile.add_fields_stage())
+        if not return_all:
+            pipeline.append(network_check_script.stages()["only_inconsistent"])
+        return self.collection.aggregate(pipeline + (stages or []), batchSize=batch_size)
+
+    def _iter_find_cached(self, match: Dict, return_all: bool, profile: CheckProfile, batch_size: int,
+                          stages: List[Dict]) -> Iterator[Dict]:
+        """
+        iter_find() of the js backend running the check in mongod only for the documents without a cached result.
+
+        The keys of a batch are read first. The documents with a cached result are read
+        without the check, the others are checked in one aggregation, in the order of the keys.
+        """
+        keys = self.collection.find(match, RESULT_KEY_PROJECTION, batch_size=batch_size)
+        for batch in _batches(keys, batch_size):
+            cached, misses = {}, []
+            for version in batch:
+                key = result_key(version, profile)
+                inconsistencies = result_cache.get(key)
+                if inconsistencies is None:
+                    misses.append(version["_id"])
+                else:
+                    cached[version["_id"]] = (key, inconsistencies)
+
+            documents = {}
+            wanted = [_id for _id, (_, inconsistencies) in cached.items() if inconsistencies or return_all]
+            if wanted:
+                pipeline = [{"$match": {"_id": {"$in": wanted}}}] + stages
+                for document in self.collection.aggregate(pipeline, batchSize=batch_size):
+                    key, inconsistencies = cached[document["_id"]]
+                    if result_key(document, profile) != key:
+                        # written since its key was read, check it like a miss
+                        misses.append(document["_id"])
+                        continue
+                    document["inconsistencies"] = inconsistencies
+                    documents[document["_id"]] = document
+            if misses:
+                for document in self._check_in_db(misses, return_all, profile, batch_size, stages):
+                    documents[document["_id"]] = document
+
+            for version in batch:
+                document = documents.get(version["_id"])
+                if document is not None and (return_all or document["inconsistencies"]):
+                    yield document
+
+    def _check_in_db(self, ids: List[Any], return_all: bool, profile: CheckProfile, batch_size: int,
+                     stages: List[Dict]) -> Iterator[Dict]:
+        """Run the check of the profile in mongod on the documents `ids` and cache the results."""
+        pipeline = [{"$match": {"_id": {"$in": ids}}}, profile.add_fields_stage()]
+        if not return_all:
+            # the consistent documents only come back with their key, to cache their empty result
+            pipeline.append({"$replaceWith": {"$cond": [
+                {"$gt": [{"$size": "$inconsistencies"}, 0]},
+                "$$ROOT",
+                {**{field: f"${field}" for field in RESULT_KEY_PROJECTION}, "inconsistencies": []},
+            ]}})
+        for document in self.collection.aggregate(pipeline + stages, batchSize=batch_size):
+            result_cache.set(result_key(document, profile), document["inconsistencies"])
+            yield document
+
+    def find(self, match: Dict, return_all: bool = True, profile: Optional[CheckProfile] = None,
+             stages: Optional[List[Dict]] = None) -> List[Dict]:
+        """Documents matching `match` with `inconsistencies` computed for the given profile."""
+        return list(self.iter_find(match, return_all, profile, stages=stages))
+
+    def find_one(self, match: Dict, return_all: bool = True, profile: Optional[CheckProfile] = None,
+                 stages: Optional[List[Dict]] = None) -> Dict:
+        if self.backend != "python" and result_cache.enabled:
+            return self._find_one_cached(match, return_all, profile or get_profile(), stages or [])
+        results = self.find(match, return_all, profile, stages)
+        return results[0] if results else {}
+
+    def _find_one_cached(self, match: Dict, return_all: bool, profile: CheckProfile, stages: List[Dict]) -> Dict:
+        """
+        find_one() of the js backend without the key read of _iter_find_cached(): the
+        document is read once without the check and completed with its cached result.
+        Only a miss runs the check in mongod.
+        """
+        document = next(self.collection.aggregate([{"$match": match}, {"$limit": 1}] + stages), None)
+        if document is None:
+            return {}
+        key = result_key(document, profile)
+        inconsistencies = result_cache.get(key)
+        if inconsistencies is None:
+            checked = next(self._check_in_db([document["_id"]], True, profile, 1, []), None)
+            if checked is None:
+                return {}
+            if result_key(checked, profile) != key:
+                # written since it was read, read it again with the check
+                checked = document = next(self._check_in_db([document["_id"]], True, profile, 1, stages), None)
+                if document is None:
+                    return {}
+            inconsistencies = checked["inconsistencies"]
+        if not return_all and not inconsistencies:
+            return {}
+        document["inconsistencies"] = inconsistencies
+        return document
+
+    def iter_all(self, profile: Optional[CheckProfile] = None, batch_size: int = inconsistency_batch_size) -> Iterator[Dict]:
+        """Stream the documents with inconsistencies, read from the materialized fields for the default profile."""
+        if profile is not None and not profile.is_default:
+            return self.iter_find({}, return_all=False, profile=profile, batch_size=batch_size)
+        return self.collection.find({"has_inconsistencies": True}, batch_size=batch_size)
+
+    def find_all(self, profile: Optional[CheckProfile] = None) -> List[Dict]:
+        """Documents with inconsistencies, read from the materialized fields for the default profile."""
+        return list(self.iter_all(profile))
+
+    def refresh(self, query: Dict, bump_revision: bool = True):
+        """
+        Recompute and store the inconsistencies of the documents matching the query.
+
+        Every write calls this right after writing, so it also bumps the revision the
+        conditional GETs compare against, in the same update.
+        """
+        if self.backend == "python":
+            cursor = self.collection.find(query, {"networks": 1, "sources": 1}, batch_size=inconsistency_batch_size)
+            operations = []
+            for doc in check_documents(cursor, get_profile()):
+                update = {"$set": inconsistency_fields(doc["inconsistencies"])}
+                if bump_revision:
+                    update.update(REVISION_UPDATE)
+                operations.append(UpdateOne({"_id": doc["_id"]}, update))
+                if len(operations) >= inconsistency_batch_size:
+                    self.collection.bulk_write(operations, ordered=False)
+                    operations = []
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+            return
+
+        self.collection.update_many(query, self.update_stages(bump_revision))
+
+    def update_stages(self, bump_revision: bool = True) -> Optional[List[Dict]]:
+        """
+        The update stages of refresh(), for a write to append to its own update pipeline
+        instead of calling refresh() after it. None for the python backend, which has to
+        read the written document to check it.
+        """
+        if self.backend == "python":
+            return None
+        update = network_check_script.stages()["update"]
+        return [REVISION_STAGE] + update if bump_revision else update
+
+    def rebuild(self):
+        """Backfill the materialized inconsistencies of the whole collection."""
+        self.collection.create_index("has_inconsistencies", partialFilterExpression={"has_inconsistencies": True})
+        self.refresh({}, bump_revision=False)
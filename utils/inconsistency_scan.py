@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.database import get_collection
+from utils.inconsistency import InconsistencyPipeline, get_profile
+
+# =============================================================================
+# Parallel sharded inconsistency scan
+# =============================================================================
+# A single aggregation cursor is processed by one thread end to end, so the
+# nightly full scan splits the collection into _id ranges and checks every
+# range in its own worker process.
+
+def shard_ranges(collection, shards: int) -> List[Tuple[Any, Any]]:
+    """
+    Split a collection into `shards` contiguous _id ranges of about the same size.
+
+    The boundaries are read from the _id index only (covered, sorted skip), so no
+    document is fetched. The lower bound is inclusive and the upper bound exclusive,
+    None means unbounded.
+    """
+    total = collection.estimated_document_count()
+    shards = max(1, min(shards, total))
+    boundaries = []
+    for i in range(1, shards):
+        boundary = list(collection.find({}, {"_id": 1}).sort("_id", 1).skip(total * i // shards).limit(1))
+        if boundary and (not boundaries or boundary[0]["_id"] != boundaries[-1]):
+            boundaries.append(boundary[0]["_id"])
+    lowers = [None] + boundaries
+    uppers = boundaries + [None]
+    return list(zip(lowers, uppers))
+
+def range_match(lower: Any, upper: Any) -> Dict:
+    condition = {}
+    if lower is not None:
+        condition["$gte"] = lower
+    if upper is not None:
+        condition["$lt"] = upper
+    return {"_id": condition} if condition else {}
+
+def _scan_shard(collection_name: str, index: int, lower: Any, upper: Any, backend: str, profile_name: Optional[str]) -> Dict:
+    # Runs in a worker process, which creates a client of its own on first use
+    started = time.perf_counter()
+    collection = get_collection(collection_name)
+    pipeline = InconsistencyPipeline(collection, backend)
+    results = pipeline.find(range_match(lower, upper), return_all=False, profile=get_profile(profile_name))
+    return {
+        "shard": index,
+        "lower": lower,
+        "upper": upper,
+        "pid": os.getpid(),
+        "inconsistent": len(results),
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": results,
+    }
+
+def scan_collection(collection, workers: int, backend: str, profile_name: Optional[str] = None,
+                    shards: Optional[int] = None) -> Dict:
+    """
+    Check a whole collection in parallel and merge the shards into one report.
+
+    :param collection: Collection to scan, only its name is sent to the workers
+    :param workers: Number of worker processes
+    :param backend: "js" to run networkCheck.js in mongod, "python" for the Python engine
+    :param profile_name: Check profile, the default profile when None
+    :param shards: Number of _id ranges, defaults to one per worker
+    :return: {"collection", "backend", "profile", "workers", "seconds", "shards", "results"}
+    """
+    started = time.perf_counter()
+    ranges = shard_ranges(collection, shards or workers)
+
+    # spawn, not fork: a forked worker would inherit the parent's MongoClient sockets
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(_scan_shard, collection.name, index, lower, upper, backend, profile_name)
+            for index, (lower, upper) in enumerate(ranges)
+        ]
+        shard_reports = [future.result() for future in futures]
+
+    results = []
+    for shard_report in shard_reports:
+        results.extend(shard_report.pop("results"))
+
+    return {
+        "collection": collection.name,
+        "backend": backend,
+        "profile": get_profile(profile_name).name,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+        "shards": shard_reports,
+        "results": results,
+    }
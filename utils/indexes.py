@@ -0,0 +1,100 @@
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from utils.database import clusters_collection, servers_collection
+from utils.search import SEARCH_INDEXES
+
+# =============================================================================
+# Declared indexes
+# =============================================================================
+# Unique ids only apply to string ids, so documents without an id do not collide on null
+SERVER_INDEXES: List[IndexModel] = [
+    IndexModel([("server_id", ASCENDING)], name="server_id_unique", unique=True,
+               partialFilterExpression={"server_id": {"$type": "string"}}),
+    # conditional GETs read the version only from the index
+    IndexModel([("server_id", ASCENDING), ("revision", ASCENDING), ("last_modified", ASCENDING)], name="server_id_revision"),
+    # newest write, see utils.revision.collection_generation
+    IndexModel([("last_modified", DESCENDING)], name="last_modified"),
+    IndexModel([("cluster_id", ASCENDING)], name="cluster_id"),
+    IndexModel([("networks.ip", ASCENDING)], name="networks_ip"),
+    IndexModel([("networks.mac", ASCENDING)], name="networks_mac"),
+    IndexModel([("has_inconsistencies", ASCENDING)], name="has_inconsistencies_1",
+               partialFilterExpression={"has_inconsistencies": True}),
+    # upsert() finds servers by hostname with the default collation, which the
+    # case-insensitive hostname_id_ci cannot serve
+    IndexModel([("hostname", ASCENDING)], name="hostname"),
+    # case-insensitive prefix filters and sort of the server table
+    *SEARCH_INDEXES,
+]
+
+CLUSTER_INDEXES: List[IndexModel] = [
+    IndexModel([("cluster_id", ASCENDING)], name="cluster_id_unique", unique=True,
+               partialFilterExpression={"cluster_id": {"$type": "string"}}),
+    # conditional GETs read the version only from the index
+    IndexModel([("cluster_id", ASCENDING), ("revision", ASCENDING), ("last_modified", ASCENDING)], name="cluster_id_revision"),
+    # newest write, see utils.revision.collection_generation
+    IndexModel([("last_modified", DESCENDING)], name="last_modified"),
+    IndexModel([("has_inconsistencies", ASCENDING)], name="has_inconsistencies_1",
+               partialFilterExpression={"has_inconsistencies": True}),
+]
+
+def declared_indexes() -> List[tuple]:
+    """(collection, index models) of every collection with declared indexes."""
+    return [(servers_collection, SERVER_INDEXES), (clusters_collection, CLUSTER_INDEXES)]
+
+# =============================================================================
+# Ensure and report
+# =============================================================================
+def ensure_indexes(collection, indexes: List[IndexModel]) -> Dict[str, str]:
+    """
+    Create the declared indexes that do not exist yet.
+
+    An index that cannot be built, e.g. a unique index over duplicated ids, is reported
+    instead of raised so the other indexes are still created.
+
+    :return: {index name: "exists" | "created" | "failed: <reason>"}
+    """
+    existing = collection.index_information()
+    status = {}
+    for index in indexes:
+        name = index.document["name"]
+        if name in existing:
+            status[name] = "exists"
+            continue
+        try:
+            collection.create_indexes([index])
+            status[name] = "created"
+        except PyMongoError as error:
+            status[name] = f"failed: {error}"
+    return status
+
+def ensure_all_indexes() -> Dict[str, Dict[str, str]]:
+    """Ensure the declared indexes of servers and clusters, keyed by collection name."""
+    return {collection.name: ensure_indexes(collection, indexes) for collection, indexes in declared_indexes()}
+
+def index_report(collection, indexes: List[IndexModel]) -> Dict[str, Any]:
+    """
+    Compare the indexes of a collection with the declared ones.
+
+    Usage comes from $indexStats, counted since the index was created or mongod restarted.
+
+    :return: {"collection", "missing", "undeclared", "unused", "usage"}
+    """
+    declared = {index.document["name"] for index in indexes}
+    existing = set(collection.index_information())
+    usage = {
+        stats["name"]: {"ops": stats["accesses"]["ops"], "since": stats["accesses"]["since"]}
+        for stats in collection.aggregate([{"$indexStats": {}}])
+    }
+    return {
+        "collection": collection.name,
+        "missing": sorted(declared - existing),
+        "undeclared": sorted(existing - declared - {"_id_"}),
+        "unused": sorted(name for name, accesses in usage.items() if name != "_id_" and accesses["ops"] == 0),
+        "usage": usage,
+    }
+
+def index_reports() -> List[Dict[str, Any]]:
+    return [index_report(collection, indexes) for collection, indexes in declared_indexes()]
@@ -0,0 +1,90 @@
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Union
+from uuid import UUID
+
+from bson import ObjectId
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+from models.lazy import LazyDict, LazyList
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib json is used without it
+    orjson = None
+
+def _isoformat(value: date) -> str:
+    # pymongo returns naive UTC datetimes
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+def default(obj: Any) -> Any:
+    """The types json and orjson do not serialize, the same way for both."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, date):
+        return _isoformat(obj)
+    if is_dataclass(obj) and not isinstance(obj, type):
+        # the models serialize the same as they are stored
+        return obj.to_dict() if hasattr(obj, "to_dict") else asdict(obj)
+    if isinstance(obj, (LazyList, LazyDict)):
+        return obj.encode()
+    if isinstance(obj, (Decimal, UUID)):
+        return str(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# dataclasses go through default() like with the stdlib, orjson writes the same ISO 8601 datetimes
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NAIVE_UTC) if orjson else 0
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider serializing ObjectId, datetime (ISO 8601) and the models natively.
+
+    Uses orjson when it is installed and the stdlib json otherwise. Calls orjson
+    cannot serve, e.g. unknown json.dumps arguments or integers over 64 bits,
+    fall back to the stdlib.
+    """
+
+    default = staticmethod(default)
+
+    def _orjson_dumps(self, obj: Any, indent: Any = None, sort_keys: Any = None) -> bytes:
+        option = _ORJSON_OPTIONS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def _orjson_can_dump(self, kwargs: dict) -> bool:
+        # separators only pick compact output, which orjson always writes
+        return orjson is not None and set(kwargs) <= {"indent", "separators", "sort_keys"}
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if self._orjson_can_dump(kwargs):
+            try:
+                return self._orjson_dumps(obj, kwargs.get("indent"), kwargs.get("sort_keys")).decode()
+            except orjson.JSONEncodeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            # the bytes go straight into the response without a str round trip
+            body = self._orjson_dumps(obj, indent)
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
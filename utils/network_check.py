@@ -0,0 +1,251 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# =============================================================================
+# Python port of utils/networkCheck.js
+# =============================================================================
+# The semantics follow check() in networkCheck.js one to one, so the "js" and
+# "python" backends return the same inconsistency documents.
+NETWORK_TYPES = ('ip', 'cidr', 'hostsubnet')
+
+DEFAULT_ALLOW_MISSING_FIELDS = {
+    'ip': ['subnet_mask', 'mac'],
+    'cidr': ['cidrs'],
+    'hostsubnet': ['egress_ips', 'mac'],
+}
+
+DEFAULT_ALLOW_MISSING_NAMES = {
+    'ip': ['admin'],
+    'cidr': [],
+    'hostsubnet': [],
+}
+
+DEFAULT_FIELDS_TO_CHECK = {
+    'ip': ['ip', 'subnet_mask', 'mac'],
+    'cidr': ['cidrs'],
+    'hostsubnet': ['hostname', 'egress_cidrs'],
+}
+
+DEFAULT_ALLOW_NULL_FIELDS = {
+    'ip': ['subnet_mask', 'mac'],
+    'cidr': ['cidrs'],
+    'hostsubnet': ['egress_ips'],
+}
+
+DEFAULT_ALLOW_NULL_NAMES = {
+    'ip': ['admin'],
+    'cidr': [],
+    'hostsubnet': [],
+}
+
+TRUTH_SOURCE = 'Truth'
+
+
+def _js_key(item: Any) -> str:
+    """Return the property key JavaScript would use for `item` in a plain object."""
+    if item is None:
+        return 'null'
+    if item is True:
+        return 'true'
+    if item is False:
+        return 'false'
+    if isinstance(item, float) and item.is_integer():
+        return str(int(item))
+    if isinstance(item, dict):
+        return '[object Object]'
+    if isinstance(item, list):
+        return ','.join('' if i is None else _js_key(i) for i in item)
+    return str(item)
+
+
+def _js_falsy(value: Any) -> bool:
+    """Mirror JavaScript truthiness: empty lists and dicts are truthy."""
+    if value is None or value is False:
+        return True
+    if isinstance(value, str):
+        return value == ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value == 0 or value != value
+    return False
+
+
+def are_values_same(a: Any, b: Any, case_sensitive: bool = False) -> bool:
+    """Case-insensitive string compare and multiset array compare, as in areValuesSame()."""
+    if isinstance(a, str) and isinstance(b, str):
+        if case_sensitive:
+            return a == b
+        return a.upper() == b.upper()
+
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return False
+        count_map: Dict[str, int] = {}
+        for item in a:
+            key = _js_key(item)
+            count_map[key] = count_map.get(key, 0) + 1
+        for item in b:
+            key = _js_key(item)
+            if not count_map.get(key):
+                return False
+            count_map[key] -= 1
+        return True
+
+    # If not string or array, the values are never considered the same
+    return False
+
+
+def _merge(defaults: Dict[str, List[str]], overrides: Optional[Dict[str, List[str]]]) -> Dict[str, frozenset]:
+    merged = {**defaults, **(overrides or {})}
+    return {key: frozenset(value or ()) for key, value in merged.items()}
+
+
+class NetworkChecker:
+    """
+    Compiled form of check() in networkCheck.js.
+
+    The option tables are merged with the defaults once, so a single checker can
+    be reused for every document of a scan.
+    """
+
+    def __init__(
+        self,
+        types: Iterable[str] = NETWORK_TYPES,
+        allow_missing_fields: Optional[Dict[str, List[str]]] = None,
+        fields_to_check: Optional[Dict[str, List[str]]] = None,
+        allow_null_fields: Optional[Dict[str, List[str]]] = None,
+        allow_missing_names: Optional[Dict[str, List[str]]] = None,
+        allow_null_names: Optional[Dict[str, List[str]]] = None,
+    ):
+        if not types:
+            raise ValueError("Type is required.")
+        if isinstance(types, str):
+            raise ValueError("Invalid type, must be an array.")
+        types = tuple(types)
+        if not all(t in NETWORK_TYPES for t in types):
+            raise ValueError("Invalid type.")
+
+        self.types = frozenset(types)
+        self.allow_missing_fields = _merge(DEFAULT_ALLOW_MISSING_FIELDS, allow_missing_fields)
+        self.allow_missing_names = _merge(DEFAULT_ALLOW_MISSING_NAMES, allow_missing_names)
+        self.allow_null_fields = _merge(DEFAULT_ALLOW_NULL_FIELDS, allow_null_fields)
+        self.allow_null_names = _merge(DEFAULT_ALLOW_NULL_NAMES, allow_null_names)
+        # fields keep their declared order, it decides the order of the details
+        self.fields_to_check = {
+            key: tuple(value or ()) for key, value in {**DEFAULT_FIELDS_TO_CHECK, **(fields_to_check or {})}.items()
+        }
+
+    def check(self, networks: Optional[List[Dict[str, Any]]], sources: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Compute the inconsistencies between the truth networks and every source."""
+        sources = sources or {}
+        if TRUTH_SOURCE in sources:
+            raise ValueError("Cannot use Truth as a source name.")
+
+        types = self.types
+        all_sources = dict(sources)
+        all_sources[TRUTH_SOURCE] = {"networks": networks or []}
+
+        # Collect all networks by `name-type` into a unified map
+        unified_map: Dict[str, List[tuple]] = {}
+        for source_name, source in all_sources.items():
+            for net in (source or {}).get("networks") or ():
+                net_type = net.get("type")
+                if net_type not in types:
+                    continue
+                key = f"{_js_key(net['name']) if 'name' in net else 'undefined'}-{net_type}"
+                entries = unified_map.get(key)
+                if entries is None:
+                    unified_map[key] = [(source_name, net)]
+                else:
+                    entries.append((source_name, net))
+
+        inconsistencies = []
+        for key, entries in unified_map.items():
+            record = entries[0][1]
+            record_name = record.get("name")
+            record_type = record["type"]
+            allow_missing_fields = self.allow_missing_fields.get(record_type, frozenset())
+            allow_null_fields = self.allow_null_fields.get(record_type, frozenset())
+            name_allows_missing = record_name in self.allow_missing_names.get(record_type, frozenset())
+            name_allows_null = record_name in self.allow_null_names.get(record_type, frozenset())
+            total_sources = len(entries)
+            details = []
+
+            for field in self.fields_to_check.get(record_type, ()):
+                field_values_list = []
+                missing_count = 0
+                null_allowed = name_allows_null or field in allow_null_fields
+                missing_allowed = field in allow_missing_fields
+
+                for source, net in entries:
+                    if field in net:
+                        value = net[field]
+                        if value is not None:
+                            for item in field_values_list:
+                                if are_values_same(item["value"], value):
+                                    if source not in item["sources"]:
+                                        item["sources"].append(source)
+                                    break
+                            else:
+                                field_values_list.append({"value": value, "sources": [source]})
+                        elif not null_allowed:
+                            missing_count += 1
+                    elif not missing_allowed and not name_allows_missing:
+                        missing_count += 1
+
+                if len(field_values_list) > 1:
+                    details.append({
+                        "field": field,
+                        "type": "mismatch",
+                        "values": field_values_list,
+                        "message": f"{field.upper()} mismatch across sources",
+                    })
+
+                if missing_count > 0 and not missing_allowed and missing_count < total_sources:
+                    details.append({
+                        "field": field,
+                        "type": "missing",
+                        "missingSources": [source for source, net in entries if _js_falsy(net.get(field))],
+                        "message": f"{field.upper()} missing in some sources",
+                    })
+
+            if details:
+                inconsistencies.append({
+                    "name": record_name,
+                    "type": record_type,
+                    "key": key,
+                    "sources": [source for source, _ in entries],
+                    "details": details,
+                })
+
+        return inconsistencies
+
+    def iter_documents(self, documents: Iterable[Dict[str, Any]], return_all: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Attach `inconsistencies` to every document of a stream, e.g. a pymongo cursor.
+
+        Documents without inconsistencies are skipped unless `return_all` is set.
+        """
+        check = self.check
+        for document in documents:
+            inconsistencies = check(document.get("networks"), document.get("sources"))
+            if inconsistencies or return_all:
+                document["inconsistencies"] = inconsistencies
+                yield document
+
+
+default_checker = NetworkChecker()
+
+
+def check(networks: Optional[List[Dict[str, Any]]], sources: Optional[Dict[str, Any]], **options) -> List[Dict[str, Any]]:
+    """Same call shape as check() in networkCheck.js."""
+    checker = NetworkChecker(**options) if options else default_checker
+    return checker.check(networks, sources)
+
+
+def inconsistency_fields(inconsistencies: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fields materialized on every server and cluster document."""
+    return {
+        "inconsistencies": inconsistencies,
+        "has_inconsistencies": bool(inconsistencies),
+        "inconsistency_count": len(inconsistencies),
+    }
+
@@ -0,0 +1,145 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Decimal128, ObjectId, Regex, Timestamp, json_util
+from pymongo.collation import Collation
+
+# Largest page the list APIs return in one response
+MAX_PAGE_SIZE = 1000
+
+# =============================================================================
+# Opaque cursors
+# =============================================================================
+def encode_cursor(document: Dict, sort_field: str = "_id", direction: int = 1) -> str:
+    """Cursor pointing just after `document` in the (sort_field, _id) order."""
+    payload = {"field": sort_field, "id": document["_id"]}
+    if sort_field != "_id":
+        payload["value"] = document.get(sort_field)
+    if direction != 1:
+        payload["direction"] = direction
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_field: str = "_id", direction: int = 1) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    # a cursor is only valid for the order it was created in
+    if (not isinstance(payload, dict) or "id" not in payload or payload.get("field") != sort_field
+            or payload.get("direction", 1) != direction):
+        raise ValueError("Invalid cursor")
+    payload.setdefault("value", None)
+    return payload
+
+def parse_limit(value: Optional[str], default: int = 100) -> int:
+    """The ?limit= query parameter as a page size between 1 and MAX_PAGE_SIZE."""
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+# =============================================================================
+# Keyset pages
+# =============================================================================
+# $type aliases in the BSON sort order, missing fields sort with null. A sort field
+# can hold several types (rack "12" or 12), and $gt/$lt never match across types.
+_TYPE_ORDER = ("null", "number", "string", "object", "array", "binData", "objectId", "bool", "date", "timestamp", "regex")
+
+# bool before number, it is a subclass of int
+_PYTHON_TYPES = (
+    (bool, "bool"), ((int, float, Decimal128), "number"), (str, "string"), (dict, "object"),
+    (list, "array"), (bytes, "binData"), (ObjectId, "objectId"), (datetime, "date"),
+    (Timestamp, "timestamp"), (Regex, "regex"),
+)
+
+def _type_position(value: Any) -> Optional[int]:
+    if value is None:
+        return 0
+    for python_type, alias in _PYTHON_TYPES:
+        if isinstance(value, python_type):
+            return _TYPE_ORDER.index(alias)
+    return None
+
+def keyset_match(cursor: Dict[str, Any], sort_field: str = "_id", direction: int = 1) -> Dict:
+    """
+    Documents after the cursor position, using _id to break ties of the sort field.
+
+    After the values of the cursor's type greater (or smaller) than it come the values
+    of the types sorted after (or before) it.
+    """
+    after = "$gt" if direction == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {after: cursor["id"]}}
+    value = cursor["value"]
+    same_value = {sort_field: value, "_id": {after: cursor["id"]}}
+    position = _type_position(value)
+    if position == 0:
+        # null sorts before every value
+        if direction == 1:
+            return {"$or": [{sort_field: {"$ne": None}}, same_value]}
+        return same_value
+    clauses = [{sort_field: {after: value}}, same_value]
+    if position is None:
+        # a type outside _TYPE_ORDER, only its own values
+        return {"$or": clauses}
+    if direction == 1:
+        later = list(_TYPE_ORDER[position + 1:])
+        if later:
+            clauses.append({sort_field: {"$type": later}})
+    else:
+        clauses.append({sort_field: None})
+        earlier = list(_TYPE_ORDER[1:position])
+        if earlier:
+            clauses.append({sort_field: {"$type": earlier}})
+    return {"$or": clauses}
+
+def _cursor_projection(projection: Optional[Dict], sort_field: str) -> Tuple[Optional[Dict], List[str]]:
+    # the cursor is built from _id and the sort field, read them even when they were not asked for
+    if not projection:
+        return projection, []
+    projection = dict(projection)
+    inclusion = any(value == 1 for value in projection.values())
+    hidden = []
+    for field in dict.fromkeys(["_id", sort_field]):
+        if inclusion and projection.get(field) != 1:
+            projection[field] = 1
+            hidden.append(field)
+        elif not inclusion and projection.get(field) == 0:
+            del projection[field]
+            hidden.append(field)
+    return projection, hidden
+
+def keyset_page(collection, query: Dict, limit: int, cursor: Optional[str] = None,
+                projection: Optional[Dict] = None, sort_field: str = "_id", direction: int = 1,
+                collation: Optional[Collation] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of documents in (sort_field, _id) order, read from where the cursor left off.
+
+    Every page is an index range scan of `limit` documents, so deep pages cost the same as the first.
+    Sorting on a field needs a (sort_field, _id) index, with the same collation as the query.
+
+    :return: (documents, cursor of the next page or None on the last page)
+    """
+    if cursor:
+        after = keyset_match(decode_cursor(cursor, sort_field, direction), sort_field, direction)
+        query = {"$and": [query, after]} if query else after
+    find_projection, hidden = _cursor_projection(projection, sort_field)
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    documents = list(collection.find(query, find_projection, collation=collation).sort(sort).limit(limit + 1))
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], sort_field, direction)
+    for document in documents:
+        for field in hidden:
+            document.pop(field, None)
+    return documents, next_cursor
@@ -0,0 +1,48 @@
+from dataclasses import fields
+from typing import Dict, List, Optional
+
+def _field_names(value: str) -> List[str]:
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    for name in names:
+        if name.startswith("$") or ".." in name or name.startswith(".") or name.endswith("."):
+            raise ValueError(f"Invalid field name: {name}")
+    # Mongo rejects a path listed together with one of its parents, e.g. sources and sources.cmdb
+    listed = set(names)
+    for name in names:
+        parts = name.split(".")
+        for depth in range(1, len(parts)):
+            parent = ".".join(parts[:depth])
+            if parent in listed:
+                raise ValueError(f"Path collision: {name} is part of {parent}")
+    return names
+
+def model_projection(model) -> Dict[str, int]:
+    """Projection of the fields of a model dataclass, documents read with it can be returned as they are."""
+    projection = {field.name: 1 for field in fields(model)}
+    projection["_id"] = 0
+    return projection
+
+def parse_projection(fields: Optional[str] = None, exclude: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """
+    Mongo projection from the comma separated `fields=` / `exclude=` query parameters.
+
+    `_id` is left out unless it is listed in `fields`. Dotted names such as
+    `sources.cmdb` select or drop one part of a sub document, a name cannot be
+    listed together with one of its parents.
+
+    :return: The projection, None when neither parameter is given
+    """
+    if fields and exclude:
+        raise ValueError("fields and exclude cannot be used together")
+    if fields:
+        names = _field_names(fields)
+        if not names:
+            raise ValueError("fields is empty")
+        projection = {name: 1 for name in names}
+        projection.setdefault("_id", 0)
+        return projection
+    if exclude:
+        projection = {name: 0 for name in _field_names(exclude)}
+        projection["_id"] = 0
+        return projection
+    return None
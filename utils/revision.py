@@ -0,0 +1,123 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Response, request
+
+# =============================================================================
+# Document revision
+# =============================================================================
+# Every write to a server or cluster bumps `revision` and sets `last_modified`,
+# see InconsistencyPipeline.refresh() which every write path goes through.
+REVISION_UPDATE = {"$inc": {"revision": 1}, "$currentDate": {"last_modified": True}}
+
+# The same as an update pipeline stage
+REVISION_STAGE = {"$set": {"revision": {"$add": [{"$ifNull": ["$revision", 0]}, 1]}, "last_modified": "$$NOW"}}
+
+# Read through the (<id>, revision, last_modified) index without fetching the document
+VERSION_PROJECTION = {"_id": 0, "revision": 1, "last_modified": 1}
+
+def with_version(projection: Dict) -> Tuple[Dict, List[str]]:
+    """
+    `projection` also reading the version of the document, so an unconditional GET
+    reads the document and its version at once. See split_version().
+
+    :return: (projection, the version fields to drop from the document again)
+    """
+    projection = dict(projection)
+    inclusion = any(value == 1 for value in projection.values())
+    hidden = []
+    for field in VERSION_PROJECTION:
+        if field == "_id":
+            continue
+        if inclusion and projection.get(field) != 1:
+            projection[field] = 1
+            hidden.append(field)
+        elif not inclusion and projection.get(field) == 0:
+            del projection[field]
+            hidden.append(field)
+    return projection, hidden
+
+def split_version(document: Dict, hidden: List[str]) -> Dict:
+    """The version of a document read with with_version(), dropping the fields that were not asked for."""
+    version = {field: document[field] for field in ("revision", "last_modified") if field in document}
+    for field in hidden:
+        document.pop(field, None)
+    return version
+
+def representation_version(version: Dict, projection: Optional[Dict]) -> Dict:
+    """
+    Version of the fields= / exclude= representation of a document. Each projection
+    is a different body of the same document version, so it is part of the ETag.
+    """
+    if not projection:
+        return version
+    digest = hashlib.blake2b(repr(sorted(projection.items())).encode(), digest_size=4).hexdigest()
+    return {**version, "revision": f"{version.get('revision', 0)}.{digest}"}
+
+def collection_generation(*collections) -> tuple:
+    """
+    Changes whenever a document of the collections is written through the app, by any process.
+
+    Per collection: the document count, which catches deletes, and the newest
+    last_modified, read from the last_modified index, which catches every other write.
+    Writes that bypass the app without setting last_modified are not seen.
+    """
+    generation = []
+    for collection in collections:
+        newest = collection.find_one({}, {"_id": 0, "last_modified": 1}, sort=[("last_modified", -1)])
+        generation.append((collection.estimated_document_count(), (newest or {}).get("last_modified")))
+    return tuple(generation)
+
+def _last_modified(version: Dict) -> Optional[datetime]:
+    last_modified = version.get("last_modified")
+    if not isinstance(last_modified, datetime):
+        return None
+    # pymongo returns naive UTC datetimes
+    return last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+
+def version_etag(version: Dict) -> str:
+    """ETag of a document version, the time part tells a recreated document from the old one."""
+    last_modified = _last_modified(version)
+    stamp = int(last_modified.timestamp() * 1000) if last_modified else 0
+    return f"{version.get('revision', 0)}-{stamp}"
+
+def composite_version(documents: List[Dict], *extra: Any) -> Dict:
+    """
+    Version of a page showing several documents, changes whenever any of them or `extra` changes.
+
+    It has no last_modified: a document leaving the page would not move the newest time forward.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for part in [version_etag(document) for document in documents] + [repr(value) for value in extra]:
+        digest.update(part.encode() + b"\0")
+    return {"revision": digest.hexdigest()}
+
+# =============================================================================
+# Conditional GET
+# =============================================================================
+def has_conditional_headers() -> bool:
+    """Whether the request sent If-None-Match or If-Modified-Since, see is_not_modified()."""
+    return bool(request.if_none_match or request.if_modified_since)
+
+def is_not_modified(version: Dict) -> bool:
+    """Whether the If-None-Match or If-Modified-Since headers of the request match the version."""
+    if request.if_none_match:
+        return request.if_none_match.contains(version_etag(version))
+    last_modified = _last_modified(version)
+    if request.if_modified_since and last_modified:
+        # HTTP dates have a one second resolution
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def add_version_headers(response: Response, version: Dict) -> Response:
+    """Send ETag and Last-Modified, and ask clients to revalidate before reusing the response."""
+    response.set_etag(version_etag(version))
+    last_modified = _last_modified(version)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified_response(version: Dict) -> Response:
+    return add_version_headers(Response(status=304), version)
@@ -0,0 +1,66 @@
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.collation import Collation
+
+# =============================================================================
+# Server table search
+# =============================================================================
+# Case-insensitive comparison (strength 2 ignores case, not accents). Queries must use
+# the same collation as the indexes below for the planner to pick them.
+SEARCH_COLLATION = Collation(locale="en", strength=2)
+
+# Columns of the server table that can be filtered on, every one has a search index
+# below. Only string columns: a string prefix never matches the numeric unit, and
+# last_updated is stored as a date or a string depending on the write.
+SEARCH_COLUMNS = (
+    "server_id", "hostname", "serial_number", "location", "datacenter", "room",
+    "rack", "os", "owner", "cluster_id",
+)
+
+# Columns the server table can be sorted on, the search box searches hostname.
+# last_updated is not sortable: it is stored as a date by create() and as a string
+# by the other writes, so its order would be by type first.
+SORT_COLUMNS = ("hostname", "server_id", "datacenter", "rack", "cluster_id")
+
+# (column, _id) serves the prefix filter of the column and, for SORT_COLUMNS, the
+# keyset pages in (column, _id) order in both directions.
+SEARCH_INDEXES: List[IndexModel] = [
+    IndexModel([(column, ASCENDING), ("_id", ASCENDING)], name=f"{column}_id_ci", collation=SEARCH_COLLATION)
+    for column in SEARCH_COLUMNS
+]
+
+# U+FFFF sorts after every character in ICU collations, so [value, value + U+FFFF)
+# is exactly the strings starting with value
+_PREFIX_END = "\uffff"
+
+def prefix_range(value: str) -> Dict[str, str]:
+    """Index range of the strings starting with `value`, no regex so nothing needs escaping."""
+    return {"$gte": value, "$lt": value + _PREFIX_END}
+
+def build_search_query(search: Optional[str] = None, search_columns: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Query of the server table: the search box matches the hostname prefix and every
+    column filter the prefix of its column. Columns outside SEARCH_COLUMNS are ignored.
+    """
+    conditions = []
+    if search and search.strip():
+        conditions.append({"hostname": prefix_range(search.strip())})
+    for column, value in (search_columns or {}).items():
+        if column in SEARCH_COLUMNS and value and value.strip():
+            conditions.append({column: prefix_range(value.strip())})
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def parse_sort(column: Optional[str], direction: Optional[str]) -> Tuple[str, int]:
+    """(sort field, 1 | -1) of a DataTables order, _id ascending for columns that cannot be sorted."""
+    if column not in SORT_COLUMNS:
+        return "_id", 1
+    return column, -1 if direction == "desc" else 1
+
+def count_matches(collection, query: Dict, limit: int) -> int:
+    """Number of documents matching the query, counted up to `limit` at most."""
+    if not query:
+        return collection.estimated_document_count()
+    return collection.count_documents(query, collation=SEARCH_COLLATION, limit=limit)
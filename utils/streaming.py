@@ -0,0 +1,37 @@
+from typing import Dict, Iterable, Iterator
+
+from flask import Response, current_app, stream_with_context
+
+# Supported values of the ?format= query parameter of the streaming list APIs
+STREAM_FORMATS = ("ndjson", "stream")
+
+def _serialize(documents: Iterable[Dict]) -> Iterator[str]:
+    dumps = current_app.json.dumps
+    for document in documents:
+        yield dumps(document, separators=(",", ":"))
+
+def _ndjson(documents: Iterable[Dict]) -> Iterator[str]:
+    for line in _serialize(documents):
+        yield line + "\n"
+
+def _json_array(documents: Iterable[Dict]) -> Iterator[str]:
+    yield "["
+    separator = ""
+    for item in _serialize(documents):
+        yield separator + item
+        separator = ","
+    yield "]"
+
+def stream_documents(documents: Iterable[Dict], format: str) -> Response:
+    """
+    Stream documents, e.g. a pymongo cursor, without building the whole list in memory.
+
+    :param documents: Documents to send, consumed lazily while the response is written
+    :param format: "ndjson" for one JSON document per line, "stream" for a chunked JSON array
+    :return: A streaming Flask response
+    """
+    if format == "ndjson":
+        return Response(stream_with_context(_ndjson(documents)), mimetype="application/x-ndjson")
+    if format == "stream":
+        return Response(stream_with_context(_json_array(documents)), mimetype="application/json")
+    raise ValueError(f"Unknown stream format: {format}")
@@ -0,0 +1,207 @@
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union, get_args, get_origin, get_type_hints
+
+from models.cluster import Cluster, Source as ClusterSource
+from models.network import NETWORK_TYPE_MAP, NetworkInterface
+from models.server import Server, Source as ServerSource
+
+# Fields the database maintains, returned by the read APIs and ignored when sent back
+SERVER_MANAGED_FIELDS = frozenset({
+    "_id", "inconsistencies", "has_inconsistencies", "inconsistency_count", "revision", "last_modified",
+})
+
+# (parent path, key, value, errors) -> None, appends {"path", "error"} for every problem
+# found. The path of the value is only formatted when there is an error to report.
+Check = Callable[[str, Union[str, int, None], Any, List[Dict[str, str]]], None]
+
+class ValidationError(ValueError):
+    """A document failed its schema, `errors` holds every {"path", "error"} found."""
+
+    def __init__(self, errors: List[Dict[str, str]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{error['path']}: {error['error']}" for error in errors))
+
+def _child(path: str, key: Union[str, int, None]) -> str:
+    if key is None:
+        return path
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if path else key
+
+def _is_blank(value: Any) -> bool:
+    # NaN is what pandas reads from an empty spreadsheet cell
+    return value is None or value == "" or (isinstance(value, float) and value != value)
+
+# =============================================================================
+# Field checks
+# =============================================================================
+def _check_text(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+    # numbers are accepted, spreadsheets and older documents store e.g. the unit as one
+    if type(value) is str:
+        return
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        errors.append({"path": _child(path, key), "error": "must be a string"})
+
+def _check_integer(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+    if isinstance(value, bool) or not (isinstance(value, int) or (isinstance(value, float) and value.is_integer())):
+        errors.append({"path": _child(path, key), "error": "must be an integer"})
+
+def _check_datetime(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+    if isinstance(value, datetime):
+        return
+    if isinstance(value, str):
+        try:
+            datetime.fromisoformat(value)
+            return
+        except ValueError:
+            pass
+    errors.append({"path": _child(path, key), "error": "must be an ISO 8601 date"})
+
+def _check_object(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+    if not isinstance(value, dict):
+        errors.append({"path": _child(path, key), "error": "must be an object"})
+
+def _check_any(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+    pass
+
+def _list_check(item_check: Check) -> Check:
+    def check(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+        path = _child(path, key)
+        if not isinstance(value, list):
+            errors.append({"path": path, "error": "must be a list"})
+            return
+        for index, item in enumerate(value):
+            item_check(path, index, item, errors)
+    return check
+
+def _mapping_check(value_check: Check) -> Check:
+    def check(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+        path = _child(path, key)
+        if not isinstance(value, dict):
+            errors.append({"path": path, "error": "must be an object"})
+            return
+        for name, item in value.items():
+            if not isinstance(name, str) or not name or name.startswith("$") or "." in name:
+                errors.append({"path": _child(path, str(name)), "error": "invalid name"})
+                continue
+            value_check(path, name, item, errors)
+    return check
+
+def _check_network(path: str, key: Union[str, int, None], value: Any, errors: List[Dict[str, str]]):
+    network_type = value.get("type") if isinstance(value, dict) else None
+    schema = NETWORK_SCHEMAS.get(network_type.lower()) if isinstance(network_type, str) else None
+    if schema is None:
+        if not isinstance(value, dict):
+            errors.append({"path": _child(path, key), "error": "must be an object"})
+        else:
+            errors.append({"path": _child(_child(path, key), "type"), "error": f"must be one of {', '.join(NETWORK_SCHEMAS)}"})
+        return
+    schema.check(path, key, value, errors)
+
+# =============================================================================
+# Compiled schemas
+# =============================================================================
+class Schema:
+    """
+    The checks of one model, compiled once from the annotations of its dataclass.
+
+    Every field is optional and may be null unless it is `required`; fields the
+    model does not have are errors, except the SERVER_MANAGED_FIELDS.
+    """
+
+    def __init__(self, model: type, required: Sequence[str] = (), required_any: Sequence[str] = (),
+                 checks: Optional[Dict[str, Check]] = None):
+        self.model = model
+        self.required = tuple(required)
+        self.required_any = tuple(required_any)
+        hints = get_type_hints(model)
+        self.checks: Dict[str, Check] = {
+            field.name: (checks or {}).get(field.name) or self._compile(hints[field.name])
+            for field in fields(model)
+        }
+
+    @classmethod
+    def _compile(cls, annotation: Any) -> Check:
+        origin, args = get_origin(annotation), get_args(annotation)
+        if origin is Union:
+            # Optional[X], null is accepted for every field that is not required
+            return cls._compile(next(arg for arg in args if arg is not type(None)))
+        if annotation is str:
+            return _check_text
+        if annotation is int:
+            return _check_integer
+        if annotation is datetime:
+            return _check_datetime
+        if origin is list:
+            item = args[0] if args else Any
+            if isinstance(item, type) and issubclass(item, NetworkInterface):
+                return _list_check(_check_network)
+            return _list_check(cls._compile(item) if item is not Any else _check_any)
+        if origin is dict:
+            item = args[1] if len(args) > 1 else Any
+            if item is Any:
+                return _check_object
+            return _mapping_check(cls._compile(item))
+        if isinstance(annotation, type) and annotation in MODEL_SCHEMAS:
+            return MODEL_SCHEMAS[annotation].check
+        raise TypeError(f"No validation for {annotation!r}")
+
+    def check(self, path: str, key: Union[str, int, None], document: Any, errors: List[Dict[str, str]]):
+        path = _child(path, key)
+        if not isinstance(document, dict):
+            errors.append({"path": path or "$", "error": "must be an object"})
+            return
+        for name in self.required:
+            if _is_blank(document.get(name)):
+                errors.append({"path": _child(path, name), "error": "is required"})
+        if self.required_any and all(_is_blank(document.get(name)) for name in self.required_any):
+            errors.append({"path": path or "$", "error": f"one of {', '.join(self.required_any)} is required"})
+        checks, required = self.checks, self.required
+        for name, value in document.items():
+            check = checks.get(name)
+            if check is None:
+                if name not in SERVER_MANAGED_FIELDS:
+                    errors.append({"path": _child(path, name), "error": "unknown field"})
+            elif value is None or (required and name in required and _is_blank(value)):
+                # null is accepted, a blank required field is already reported
+                continue
+            elif type(value) is float and value != value:
+                # NaN, an empty spreadsheet cell, is null as well
+                continue
+            else:
+                check(path, name, value, errors)
+
+    def validate(self, document: Any) -> List[Dict[str, str]]:
+        """Every error of one document as {"path", "error"}, empty when it is valid."""
+        errors: List[Dict[str, str]] = []
+        self.check("", None, document, errors)
+        return errors
+
+    def validate_batch(self, documents: Iterable[Any]) -> Dict[int, List[Dict[str, str]]]:
+        """The errors of the invalid documents of a batch, keyed by their index."""
+        invalid = {}
+        for index, document in enumerate(documents):
+            errors = self.validate(document)
+            if errors:
+                invalid[index] = errors
+        return invalid
+
+    def check_valid(self, document: Any):
+        """Raise ValidationError when the document is invalid."""
+        errors = self.validate(document)
+        if errors:
+            raise ValidationError(errors)
+
+# Schemas of the nested models, looked up while compiling the ones that contain them
+MODEL_SCHEMAS: Dict[type, Schema] = {}
+
+NETWORK_SCHEMAS: Dict[str, Schema] = {
+    network_type: Schema(network_class, required=("name", "type"))
+    for network_type, network_class in NETWORK_TYPE_MAP.items()
+}
+
+SERVER_SOURCE_SCHEMA = MODEL_SCHEMAS[ServerSource] = Schema(ServerSource)
+SERVER_SCHEMA = MODEL_SCHEMAS[Server] = Schema(Server, required=("server_id",))
+CLUSTER_SOURCE_SCHEMA = MODEL_SCHEMAS[ClusterSource] = Schema(ClusterSource)
+CLUSTER_SCHEMA = MODEL_SCHEMAS[Cluster] = Schema(Cluster, required_any=("cluster_id", "env_config"))
@@ -1,19 +1,20 @@
-from flask import Blueprint, render_template, request, jsonify
-from services.cluster import ClusterService
+from flask import Blueprint, make_response, render_template, request, jsonify, session
+from services.cluster import CLUSTER_PROJECTION, ClusterService
+from utils.revision import add_version_headers, composite_version, has_conditional_headers, is_not_modified, not_modified_response
 
 cluster_bp = Blueprint('cluster_bp', __name__)
 
+# The cluster table does not show the networks and sources, leave them in the database
+CLUSTER_TABLE_PROJECTION = {name: value for name, value in CLUSTER_PROJECTION.items() if name not in ("networks", "sources")}
+
 # ok
 @cluster_bp.route("/", methods=["GET"])
 def show_clusters():
     """Get all clusters."""
 
     cluster_service = ClusterService()
-    clusters = cluster_service.get_all()
-    if not clusters:
-        clusters = []
-    else:
-        clusters = [cluster.to_dict() for cluster in clusters]
+    # the table only shows the stored fields, no need to build the models
+    clusters = cluster_service.get_all(CLUSTER_TABLE_PROJECTION) or []
 
     return render_template('cluster.html', clusters=clusters)
 
@@ -23,13 +24,22 @@ def cluster_details(cluster_id):
     """Get all clusters."""
 
     cluster_service = ClusterService()
-    cluster = cluster_service.find_network_inconsistencies(cluster_id)
+    # pending flash messages must be rendered, never answer them with a 304
+    if has_conditional_headers() and not session.get('_flashes'):
+        # answer If-None-Match / If-Modified-Since from the versions alone
+        version = cluster_service.get_details_version(cluster_id)
+        if version is None:
+            return render_template('cluster-details.html', cluster={})
+        if is_not_modified(version):
+            return not_modified_response(version)
+
+    cluster = cluster_service.get_details(cluster_id)
     if not cluster:
-        cluster = {}
-    # else:
-    #     cluster = cluster.to_dict()
-
-    return render_template('cluster-details.html', cluster=cluster)
+        return render_template('cluster-details.html', cluster={})
+    # the page also lists the member servers, its version is the one of everything on it
+    version = composite_version([cluster] + cluster.get("servers", []))
+    response = make_response(render_template('cluster-details.html', cluster=cluster))
+    return add_version_headers(response, version)
 
 @cluster_bp.route("/network-inconsistencies", methods=["GET"])
 def show_network_inconsistencies_clusters():
@@ -1,8 +1,16 @@
 from flask import Blueprint, request, jsonify
 from flask_deprecate import deprecate_route
 from models.cluster import Cluster
-from services import AlreadyExistError
-from services.cluster import ClusterService
+from models.lazy import load
+from services import AlreadyExistError, DataNotFoundError
+from services.cluster import CLUSTER_PROJECTION, ClusterService
+from utils.config import bulk_max_items
+from utils.inconsistency import get_profile
+from utils.pagination import parse_limit
+from utils.projection import parse_projection
+from utils.revision import add_version_headers, has_conditional_headers, is_not_modified, not_modified_response, representation_version, split_version, with_version
+from utils.streaming import STREAM_FORMATS, stream_documents
+from utils.validation import CLUSTER_SCHEMA
 
 cluster_api = Blueprint('cluster_api', __name__)
 
@@ -10,21 +18,54 @@ cluster_api = Blueprint('cluster_api', __name__)
 @cluster_api.route("/", methods=["GET"])
 def get_clusters():
     """Get all cluster."""
+    try:
+        # without fields= or exclude=, the fields of the model as they are stored
+        projection = parse_projection(request.args.get("fields"), request.args.get("exclude")) or CLUSTER_PROJECTION
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     cluster_service = ClusterService()
-    clusters = cluster_service.get_all()
+    if "limit" in request.args or "cursor" in request.args:
+        # keyset pagination: {"data": [...], "limit": n, "next_cursor": "..." | null}
+        try:
+            limit = parse_limit(request.args.get("limit"))
+            clusters, next_cursor = cluster_service.get_page(limit, request.args.get("cursor"), projection)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"data": clusters, "limit": limit, "next_cursor": next_cursor}), 200
+
+    clusters = cluster_service.get_all(projection)
     if not clusters:
         return jsonify({"error": "No cluster found"}), 404
-    return jsonify([cluster.to_dict() for cluster in clusters]), 200
+    # only the requested fields were read, return them as they are stored
+    return jsonify(clusters), 200
 
 # okk
 @cluster_api.route("/<string:cluster_id>", methods=["GET"])
 def get_cluster(cluster_id):
     """Get a single cluster by ID."""
+    try:
+        requested = parse_projection(request.args.get("fields"), request.args.get("exclude"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     cluster_service = ClusterService()
-    cluster = cluster_service.get(cluster_id)
-    if not cluster:
+    if has_conditional_headers():
+        # answer If-None-Match / If-Modified-Since from the version alone
+        version = cluster_service.get_version(cluster_id)
+        if version is None:
+            return jsonify({"error": "Cluster not found"}), 404
+        version = representation_version(version, requested)
+        if is_not_modified(version):
+            return not_modified_response(version)
+
+    # without fields= or exclude=, the fields of the model as they are stored
+    projection, hidden = with_version(requested or CLUSTER_PROJECTION)
+    cluster = cluster_service.get(cluster_id, projection)
+    if cluster is None:
         return jsonify({"error": "Cluster not found"}), 404
-    return jsonify(cluster.to_dict()), 200
+    version = representation_version(split_version(cluster, hidden), requested)
+    return add_version_headers(jsonify(cluster), version), 200
 
 # okk
 @cluster_api.route("/", methods=["POST"])
@@ -33,9 +74,13 @@ def create_cluster():
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
+
+    errors = CLUSTER_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
     try:
-        cluster = Cluster.from_dict(data)
+        cluster = load(Cluster.from_dict(data))
     except Exception as e:
         return jsonify({"error": f"Invalid data provided: {str(e)}"}), 400
 
@@ -56,17 +101,20 @@ def upsert_cluster(cluster_id):
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
+
+    errors = CLUSTER_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
     try:
-        cluster = Cluster.from_dict(data)
+        cluster = load(Cluster.from_dict(data))
     except Exception as e:
         return jsonify({"error": f"Invalid data provided: {str(e)}"}), 400
     
     try:
         cluster_service = ClusterService()    
-        existing_cluster = cluster_service.get(cluster_id)
-        create = existing_cluster is None
-        result_id, _ = cluster_service.upsert(cluster_id, cluster)
+        result_id, result = cluster_service.upsert(cluster_id, cluster)
+        create = result.upserted_id is not None
     except Exception as e:
         return jsonify({"error": f"Failed to update cluster: {str(e)}"}), 500
 
@@ -82,24 +130,25 @@ def patch_cluster(cluster_id):
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
+
+    errors = CLUSTER_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
     try:
-        cluster = Cluster.from_dict(data)
+        cluster = load(Cluster.from_dict(data))
     except Exception as e:
         return jsonify({"error": f"Invalid data provided: {str(e)}"}), 400
     
     try:
         cluster_service = ClusterService()    
-        existing_cluster = cluster_service.get(cluster_id)
-        create = existing_cluster is None
         result_id = cluster_service.patch(cluster_id, cluster)
+    except DataNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": f"Failed to update cluster: {str(e)}"}), 500
 
-    if create:
-        return jsonify({"id": result_id, "message": "Cluster created"}), 201
-    else:
-        return jsonify({"id": result_id, "message": "Cluster updated"}), 200
+    return jsonify({"id": result_id, "message": "Cluster updated"}), 200
 
 # okk
 @cluster_api.route("/<string:cluster_id>", methods=["DELETE"])
@@ -114,32 +163,57 @@ def delete_cluster(cluster_id):
 # okk
 @cluster_api.route("/network-inconsistencies", methods = ['GET'])
 def get_ip_inconsistencies():
+    try:
+        profile = get_profile(request.args.get("profile"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     cluster_service = ClusterService()
-    inconsistencies =  cluster_service.find_network_inconsistencies_all()
+    response_format = request.args.get("format")
+    if response_format in STREAM_FORMATS:
+        # stream NDJSON or a chunked JSON array straight from the cursor
+        return stream_documents(cluster_service.iter_network_inconsistencies_all(profile), response_format), 200
+
+    inconsistencies =  cluster_service.find_network_inconsistencies_all(profile)
     
     if inconsistencies is None:
         return jsonify([]), 200
-    
-    for instance in inconsistencies:
-        if "_id" in instance:
-            instance["_id"] = str(instance["_id"])
 
     return jsonify(inconsistencies), 200
 
 # okk
 @cluster_api.route("<string:cluster_id>/network-inconsistencies", methods = ['GET'])
 def get_cluster_ip_inconsistencies(cluster_id):
+    try:
+        profile = get_profile(request.args.get("profile"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     cluster_service = ClusterService()
-    inconsistency =  cluster_service.find_network_inconsistencies(cluster_id)
+    inconsistency =  cluster_service.find_network_inconsistencies(cluster_id, profile=profile)
     
     if inconsistency is None:
         return jsonify({}), 200
-    
-    if "_id" in inconsistency:
-        inconsistency["_id"] = str(inconsistency["_id"])
 
     return jsonify(inconsistency), 200
 
+@cluster_api.route("/batch/<string:source_name>", methods=["PUT"])
+def batch_update_source(source_name):
+    """Batch update data of a source: [{"cluster_id": ..., **source}, ...]."""
+    data = request.json  # Expects a list of updates for a specific source
+    if not isinstance(data, list):
+        return jsonify({"error": "A list of source updates is required"}), 400
+    if len(data) > bulk_max_items:
+        return jsonify({"error": f"At most {bulk_max_items} updates per request"}), 400
+
+    try:
+        cluster_service = ClusterService()
+        result = cluster_service.bulk_update_source(source_name, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"message": "Batch source update completed", **result}), 200
+
 # ------------------------------
 # Deprecated API
 # ------------------------------
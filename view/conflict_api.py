@@ -0,0 +1,31 @@
+from flask import Blueprint, jsonify, request
+from services.conflict import ConflictService
+from services.overlap import OverlapService
+from utils.streaming import STREAM_FORMATS, stream_documents
+
+conflict_api = Blueprint('conflict_api', __name__)
+
+@conflict_api.route("/", methods=["GET"])
+def get_conflicts():
+    """Get the IP and MAC addresses claimed by more than one server or cluster."""
+    conflict_service = ConflictService()
+    try:
+        conflicts = conflict_service.iter_conflicts(request.args.get("type"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response_format = request.args.get("format")
+    if response_format in STREAM_FORMATS:
+        return stream_documents(conflicts, response_format), 200
+
+    return jsonify(list(conflicts)), 200
+
+@conflict_api.route("/cidrs", methods=["GET"])
+def get_cidr_overlaps():
+    """Get the cluster CIDRs overlapping another cluster's CIDRs or a server IP."""
+    overlap_service = OverlapService()
+    try:
+        overlaps = overlap_service.find_overlaps(request.args.get("type"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(overlaps), 200
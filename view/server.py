@@ -1,25 +1,27 @@
-from flask import Blueprint, flash, redirect, render_template, request, jsonify, url_for
+from flask import Blueprint, flash, make_response, redirect, render_template, request, jsonify, session, url_for
 from bson.objectid import ObjectId
 from datetime import datetime, timezone
 from flask_deprecate import deprecate_route
 from models.server import Server, Source
 from services import AlreadyExistError
 from utils.database import servers_collection
-from services.server import ServerService
+from services.server import SERVER_PROJECTION, ServerService
+from utils.revision import add_version_headers, composite_version, has_conditional_headers, is_not_modified, not_modified_response
+from utils.search import parse_sort
 
 server_bp = Blueprint('server_bp', __name__)
 
+# The server table does not show the networks and sources, leave them in the database
+SERVER_TABLE_PROJECTION = {name: value for name, value in SERVER_PROJECTION.items() if name not in ("networks", "sources")}
+
 # ok
 @server_bp.route("/", methods=["GET"])
 def show_servers():
     """Get all servers."""
 
     server_service = ServerService()
-    servers = server_service.get_all()
-    if not servers:
-        servers = []
-    else:
-        servers = [server.to_dict() for server in servers]
+    # the table only shows the stored fields, no need to build the models
+    servers = server_service.get_all(SERVER_TABLE_PROJECTION) or []
 
     return render_template('server.html', servers=servers)
 
@@ -33,22 +35,34 @@ def show_servers_ajax():
     # Get pagination parameters from the request
     page = int(request.args.get('page', 1))  # Default to page 1
     limit = int(request.args.get('limit', 10))  # Default to 10 items per page
-    search = str(request.args.get('search[value]', None))  # Default to 10 items per page
+    search = request.args.get('search[value]', '')  # Prefix of the hostname
     
     # Dynamically get the columns from the request
     columns = [request.args.get(f'columns[{i}][data]') for i in range(len(request.args)) if request.args.get(f'columns[{i}][data]')]
 
     # Convert the search parameters to a dictionary
-    search_columns = {col: str(request.args.get(f'columns[{i}][search][value]', None)) for i, col in enumerate(columns)}
+    search_columns = {col: request.args.get(f'columns[{i}][search][value]', '') for i, col in enumerate(columns)}
+
+    # Cursor of this page, returned as next_cursor with the previous page
+    cursor = request.args.get('cursor') or None
+
+    # Server-side sorting on the first DataTables order, only on the indexed SORT_COLUMNS
+    order_column = request.args.get('order[0][column]')
+    sort_column = request.args.get(f'columns[{order_column}][data]') if order_column is not None else None
+    sort_field, direction = parse_sort(sort_column, request.args.get('order[0][dir]'))
 
     # Fetch the data with pagination
-    servers, total_count = server_service.get_paginated(page, limit, search, search_columns)
+    try:
+        servers, total_count, filtered_count, next_cursor = server_service.get_paginated(page, limit, search, search_columns, cursor, sort_field, direction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if request.args.get('ajax'):  # Check if it's an AJAX request
         server_dicts = [server.to_dict() for server in servers] if servers else []
         return jsonify({
             "data": server_dicts,
             "recordsTotal": total_count,
-            "recordsFiltered": total_count,
+            "recordsFiltered": filtered_count,
+            "next_cursor": next_cursor,
         })
         
     if not servers:
@@ -74,14 +88,23 @@ def server_details(server_id):
         except Exception as e:
             flash("error: " + str(e))
             return redirect(url_for('server_bp.server_details', server_id=server_id))
-        
-    server = server_service.find_network_inconsistencies(server_id)
-    if not server:
-        server = {}
-    # else:
-    #     server = server.to_dict()
 
-    return render_template('server-details.html', server=server)
+    # pending flash messages must be rendered, never answer them with a 304
+    if has_conditional_headers() and not session.get('_flashes'):
+        # answer If-None-Match / If-Modified-Since from the versions alone
+        version = server_service.get_details_version(server_id)
+        if version is None:
+            return render_template('server-details.html', server={})
+        if is_not_modified(version):
+            return not_modified_response(version)
+
+    server = server_service.get_details(server_id)
+    if not server:
+        return render_template('server-details.html', server={})
+    # the page also shows the cluster, its version is the one of everything on it
+    version = composite_version([server, server.get("cluster", {})])
+    response = make_response(render_template('server-details.html', server=server))
+    return add_version_headers(response, version)
 
 @server_bp.route("/<string:server_id>/edit", methods=["GET"])
 def edit_server(server_id):
@@ -2,10 +2,18 @@ from flask import Blueprint, request, jsonify
 from bson.objectid import ObjectId
 from datetime import datetime, timezone
 from flask_deprecate import deprecate_route
+from models.lazy import load
 from models.server import Server, Source
-from services import AlreadyExistError
+from services import AlreadyExistError, DataNotFoundError
 from utils.database import servers_collection
-from services.server import ServerService
+from services.server import SERVER_PROJECTION, ServerService
+from utils.config import bulk_max_items
+from utils.inconsistency import get_profile
+from utils.pagination import parse_limit
+from utils.projection import parse_projection
+from utils.revision import REVISION_UPDATE, add_version_headers, has_conditional_headers, is_not_modified, not_modified_response, representation_version, split_version, with_version
+from utils.streaming import STREAM_FORMATS, stream_documents
+from utils.validation import SERVER_SCHEMA, SERVER_SOURCE_SCHEMA
 
 server_api = Blueprint('server_api', __name__)
 
@@ -13,21 +21,54 @@ server_api = Blueprint('server_api', __name__)
 @server_api.route("/", methods=["GET"])
 def get_servers():
     """Get all servers."""
+    try:
+        # without fields= or exclude=, the fields of the model as they are stored
+        projection = parse_projection(request.args.get("fields"), request.args.get("exclude")) or SERVER_PROJECTION
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     server_service = ServerService()
-    servers = server_service.get_all()
+    if "limit" in request.args or "cursor" in request.args:
+        # keyset pagination: {"data": [...], "limit": n, "next_cursor": "..." | null}
+        try:
+            limit = parse_limit(request.args.get("limit"))
+            servers, next_cursor = server_service.get_page(limit, request.args.get("cursor"), projection)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"data": servers, "limit": limit, "next_cursor": next_cursor}), 200
+
+    servers = server_service.get_all(projection)
     if not servers:
         return jsonify({"error": "No server found"}), 404
-    return jsonify([server.to_dict() for server in servers]), 200
+    # only the requested fields were read, return them as they are stored
+    return jsonify(servers), 200
 
 # okk
 @server_api.route("/<string:server_id>", methods=["GET"])
 def get_server(server_id):
     """Get a single server by ID."""
+    try:
+        requested = parse_projection(request.args.get("fields"), request.args.get("exclude"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     server_service = ServerService()
-    server = server_service.get(server_id)
-    if not server:
+    if has_conditional_headers():
+        # answer If-None-Match / If-Modified-Since from the version alone
+        version = server_service.get_version(server_id)
+        if version is None:
+            return jsonify({"error": "Server not found"}), 404
+        version = representation_version(version, requested)
+        if is_not_modified(version):
+            return not_modified_response(version)
+
+    # without fields= or exclude=, the fields of the model as they are stored
+    projection, hidden = with_version(requested or SERVER_PROJECTION)
+    server = server_service.get(server_id, projection)
+    if server is None:
         return jsonify({"error": "Server not found"}), 404
-    return jsonify(server.to_dict()), 200
+    version = representation_version(split_version(server, hidden), requested)
+    return add_version_headers(jsonify(server), version), 200
 
 # okk
 @server_api.route("/", methods=["POST"])
@@ -36,9 +77,13 @@ def create_server():
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
+
+    errors = SERVER_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
     try:
-        server = Server.from_dict(data)
+        server = load(Server.from_dict(data))
     except Exception as e:
         return jsonify({"error": f"Invalid data provided: {str(e)}"}), 400
 
@@ -52,6 +97,26 @@ def create_server():
 
     return jsonify({"message": "Server created", "id": str(created_server_id)}), 201
 
+@server_api.route("/_bulk", methods=["POST"])
+def bulk_upsert_servers():
+    """Create or update many servers by server_id in one request."""
+    data = request.json
+    if not isinstance(data, list) or not data:
+        return jsonify({"error": "A non-empty list of servers is required"}), 400
+    if len(data) > bulk_max_items:
+        return jsonify({"error": f"At most {bulk_max_items} servers per request"}), 400
+
+    try:
+        server_service = ServerService()
+        results = server_service.bulk_upsert(data)
+    except Exception as e:
+        return jsonify({"error": f"Failed to upsert servers: {str(e)}"}), 500
+
+    summary = {status: 0 for status in ("created", "updated", "unchanged", "error")}
+    for result in results:
+        summary[result["status"]] += 1
+    return jsonify({"summary": summary, "results": results}), 200
+
 # okk
 @server_api.route("/<string:server_id>", methods=["PUT"])
 def upsert_server(server_id):
@@ -59,17 +124,20 @@ def upsert_server(server_id):
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
+
+    errors = SERVER_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
     try:
-        server = Server.from_dict(data)
+        server = load(Server.from_dict(data))
     except Exception as e:
         return jsonify({"error": f"Invalid data provided: {str(e)}"}), 400
     
     try:
         server_service = ServerService()    
-        existing_server = server_service.get(server_id)
-        create = existing_server is None
-        result_server_id, _ = server_service.upsert(server_id = server_id, server = server)
+        result_server_id, result = server_service.upsert(server_id = server_id, server = server)
+        create = result.upserted_id is not None
     except Exception as e:
         return jsonify({"error": f"Failed to update server: {str(e)}"}), 500
 
@@ -85,24 +153,25 @@ def patch_server(server_id):
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
+
+    errors = SERVER_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
     try:
-        server = Server.from_dict(data)
+        server = load(Server.from_dict(data))
     except Exception as e:
         return jsonify({"error": f"Invalid data provided: {str(e)}"}), 400
     
     try:
         server_service = ServerService()    
-        existing_server = server_service.get(server_id)
-        create = existing_server is None
         result_server_id = server_service.patch(server_id, server)
+    except DataNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": f"Failed to update server: {str(e)}"}), 500
 
-    if create:
-        return jsonify({"id": result_server_id, "message": "Server created"}), 201
-    else:
-        return jsonify({"id": result_server_id, "message": "Server updated"}), 200
+    return jsonify({"id": result_server_id, "message": "Server updated"}), 200
 
 # okk
 @server_api.route("/<string:server_id>", methods=["DELETE"])
@@ -117,29 +186,37 @@ def delete_server(server_id):
 # okk
 @server_api.route("/network-inconsistencies", methods = ['GET'])
 def get_ip_inconsistencies():
+    try:
+        profile = get_profile(request.args.get("profile"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     server_service = ServerService()
-    inconsistencies =  server_service.find_network_inconsistencies_all()
+    response_format = request.args.get("format")
+    if response_format in STREAM_FORMATS:
+        # stream NDJSON or a chunked JSON array straight from the cursor
+        return stream_documents(server_service.iter_network_inconsistencies_all(profile), response_format), 200
+
+    inconsistencies =  server_service.find_network_inconsistencies_all(profile)
     
     if inconsistencies is None:
         return jsonify([]), 200
-    
-    for instance in inconsistencies:
-        if "_id" in instance:
-            instance["_id"] = str(instance["_id"])
 
     return jsonify(inconsistencies), 200
 
 # okk
 @server_api.route("<string:server_id>/network-inconsistencies", methods = ['GET'])
 def get_server_ip_inconsistencies(server_id):
+    try:
+        profile = get_profile(request.args.get("profile"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     server_service = ServerService()
-    inconsistency =  server_service.find_network_inconsistencies(server_id)
+    inconsistency =  server_service.find_network_inconsistencies(server_id, profile=profile)
     
     if inconsistency is None:
         return jsonify({}), 200
-    
-    if "_id" in inconsistency:
-        inconsistency["_id"] = str(inconsistency["_id"])
 
     return jsonify(inconsistency), 200
 
@@ -150,10 +227,14 @@ def get_server_ip_inconsistencies(server_id):
 def batch_update_servers():
     """Batch update servers."""
     data = request.json  # Expects a list of server updates
+    updated = []
     for update in data:
         server_id = update.pop("_id", None)
         if server_id:
-            servers_collection.update_one({"_id": ObjectId(server_id)}, {"$set": update})
+            updated.append(ObjectId(server_id))
+            servers_collection.update_one({"_id": updated[-1]}, {"$set": update, **REVISION_UPDATE})
+    if updated:
+        ServerService().refresh_inconsistencies({"_id": {"$in": updated}})
     return jsonify({"message": "Batch update completed"}), 200
 
 @server_api.route("/<string:server_id>/sources/<string:source_name>", methods=["PUT"])
@@ -165,30 +246,28 @@ def update_source(server_id, source_name):
     if not server:
         return jsonify({"error": "Server not found"}), 404
 
-    source = Source.from_dict(data)
+    errors = SERVER_SOURCE_SCHEMA.validate(data)
+    if errors:
+        return jsonify({"error": "Invalid data provided", "errors": errors}), 400
+
+    source = load(Source.from_dict(data))
     server_service.create_or_update_source(server_id, source_name, source)
 
     return jsonify({"message": "Source created or updated"}), 200
 
 @server_api.route("/batch/<string:source_name>", methods=["PUT"])
 def batch_update_source(source_name):
-    """Batch update data of a source."""
-    server_service = ServerService()
+    """Batch update data of a source: [{"server_id": ..., **source}, ...]."""
     data = request.json  # Expects a list of updates for a specific source
-    for update in data:
-        server_id = update.pop("server_id", None)
-        if not server_id:
-            continue
-
-        server = server_service.get(server_id)
-        if not server:
-            continue
-
-        # Check if the source exists in the dictionary
-        sources = server.get("sources", {})
-        if source_name in sources:
-            sources[source_name]["networks"] = update.get("networks", sources[source_name]["networks"])
-            sources[source_name]["last_updated"] = datetime.now(timezone.utc).isoformat()
-            servers_collection.update_one({"_id": ObjectId(server_id)}, {"$set": {"sources": sources}})
-
-    return jsonify({"message": "Batch source update completed"}), 200
+    if not isinstance(data, list):
+        return jsonify({"error": "A list of source updates is required"}), 400
+    if len(data) > bulk_max_items:
+        return jsonify({"error": f"At most {bulk_max_items} updates per request"}), 400
+
+    try:
+        server_service = ServerService()
+        result = server_service.bulk_update_source(source_name, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"message": "Batch source update completed", **result}), 200
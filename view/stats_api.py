@@ -0,0 +1,10 @@
+from flask import Blueprint, jsonify
+from services.stats import StatsService
+
+stats_api = Blueprint('stats_api', __name__)
+
+@stats_api.route("/", methods=["GET"])
+def get_stats():
+    """Get the dashboard counters."""
+    stats_service = StatsService()
+    return jsonify(stats_service.get()), 200
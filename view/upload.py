@@ -11,6 +11,8 @@ from utils.database import servers_collection
 from flask_session import Session
 from models.server import Server, Source
 from models.network import IPNetwork
+from services.server import ServerService
+from utils.validation import SERVER_SCHEMA
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -79,6 +81,12 @@ def process_mapping():
         # Map the columns based on user input and convert to database schema format
         formatted_data = process_uploaded_data_inventory_handbook(uploaded_data, column_mapping, "inventory_handbook")
 
+        # Reject the whole file before anything is written when a row is invalid
+        invalid = SERVER_SCHEMA.validate_batch(server.to_dict() for server in formatted_data)
+        if invalid:
+            rows = [{"index": index, "errors": errors} for index, errors in invalid.items()]
+            return jsonify({"error": f"{len(rows)} invalid rows, nothing was imported", "rows": rows}), 400
+
         # Insert formatted data into MongoDB
         servers = []
         if formatted_data:
@@ -149,6 +157,7 @@ def process_uploaded_data_inventory_handbook(uploaded_data, column_mapping, sour
 def upsert_multiple_servers(server_data_list: list[Server]):
 
     bulk_operations = []
+    server_ids = []
     if server_data_list:
         for server_data in server_data_list:
             server_id = server_data.server_id
@@ -177,6 +186,7 @@ def upsert_multiple_servers(server_data_list: list[Server]):
                 update_operations.append(set_operations)
             
             # Add the operation to bulk_operations
+            server_ids.append(server_id)
             bulk_operations.append(
                 UpdateOne(filter = update_query, update = update_operations, upsert=True),
             )
@@ -186,6 +196,7 @@ def upsert_multiple_servers(server_data_list: list[Server]):
         try:
             result = servers_collection.bulk_write(bulk_operations)
             print(f"Bulk operation completed: {result.bulk_api_result}")
+            ServerService().refresh_inconsistencies({"server_id": {"$in": server_ids}})
         except Exception as e:
             print(f"Error during bulk operation: {e}")
     else: